@@ -4,12 +4,21 @@
 # Original repo https://bit.ly/2yJwysL
 
 from PiicoDev_Unified import *
+import struct
 
 compat_str = '\nUnified PiicoDev library out of date.  Get the latest module: https://piico.dev/unified \n'
 
+_STANDBY_MS = (0.5, 62.5, 125, 250, 500, 1000, 10, 20)   # Normal mode standby time for each t_sb setting
+# Typical current draw (uA) while measuring each quantity, while in standby (normal mode) and while asleep (datasheet section 1)
+_TEMPERATURE_UA = 350
+_PRESSURE_UA = 714
+_HUMIDITY_UA = 340
+_STANDBY_UA = 0.2
+_SLEEP_UA = 0.1
+
 class PiicoDev_BME280:
 
-    def __init__(self, bus=None, freq=None, sda=None, scl=None, t_mode=2, p_mode=5, h_mode=1, iir=1, address=0x77):
+    def __init__(self, bus=None, freq=None, sda=None, scl=None, t_mode=2, p_mode=5, h_mode=1, iir=1, address=0x77, calibration_cache=None):
         try:
             if compat_ind >= 1:
                 pass
@@ -23,39 +32,63 @@ class PiicoDev_BME280:
         self.h_mode = h_mode
         self.iir = iir
         self.addr = address
+        self._data = bytearray(8)     # 0xF7-0xFE pressure, temperature and humidity data block
+        self._normal_mode = False
+        self._standby = 0
 
         self._t_fine = 0
-        try:
-            self._T1 = self._read16(0x88)
-        except Exception as e:
-            print(i2c_err_str.format(self.addr))
-            raise e
-        self._T2 = self._short(self._read16(0x8A))
-        self._T3 = self._short(self._read16(0x8C))
-        self._P1 = self._read16(0x8E)
-        self._P2 = self._short(self._read16(0x90))
-        self._P3 = self._short(self._read16(0x92))
-        self._P4 = self._short(self._read16(0x94))
-        self._P5 = self._short(self._read16(0x96))
-        self._P6 = self._short(self._read16(0x98))
-        self._P7 = self._short(self._read16(0x9A))
-        self._P8 = self._short(self._read16(0x9C))
-        self._P9 = self._short(self._read16(0x9E))
-        self._H1 = self._read8(0xA1)
-        self._H2 = self._short(self._read16(0xE1))
-        self._H3 = self._read8(0xE3)
-        a = self._read8(0xE5)
-        self._H4 = (self._read8(0xE4)<<4)+(a%16)
-        self._H5 = (self._read8(0xE6)<<4)+(a>>4)
-        self._H6 = self._read8(0xE7)
-        if self._H6 > 127:
-            self._H6 -= 256
+        calibration = self._load_calibration(calibration_cache)
+        if not calibration:
+            calibration = bytearray(33)     # 0x88-0xA1 followed by 0xE1-0xE7
+            try:
+                self._read_into(0x88, memoryview(calibration)[0:26])
+            except Exception as e:
+                print(i2c_err_str.format(self.addr))
+                raise e
+            self._read_into(0xE1, memoryview(calibration)[26:33])
+            self._save_calibration(calibration_cache, calibration)
+        (self._T1, self._T2, self._T3,
+         self._P1, self._P2, self._P3, self._P4, self._P5, self._P6, self._P7, self._P8, self._P9,
+         self._H1, self._H2, self._H3, e4, e5, e6, self._H6) = struct.unpack_from('<HhhHhhhhhhhhxBhBBBBb', calibration)
+        self._H4 = (e4<<4)+(e5%16)
+        self._H5 = (e6<<4)+(e5>>4)
         self._write8(0xF2, self.h_mode)
         sleep_ms(2)
         self._write8(0xF4, 0x24)
         sleep_ms(2)
         self._write8(0xF5, self.iir<<2)
-        
+
+    def _load_calibration(self, calibration_cache):
+        """ Load the calibration registers saved by a previous boot, or None if there are none.
+            Delete the cache file if the sensor is replaced.
+        """
+        if not calibration_cache:
+            return None
+        try:
+            with open(calibration_cache, 'rb') as f:
+                calibration = f.read()
+            if len(calibration) == 33:
+                return calibration
+        except OSError:
+            pass
+        return None
+
+    def _save_calibration(self, calibration_cache, calibration):
+        if not calibration_cache:
+            return
+        try:
+            with open(calibration_cache, 'wb') as f:
+                f.write(calibration)
+        except OSError:
+            pass
+
+    def _read_into(self, reg, buf):
+        """ Read a block of consecutive registers in a single transaction. """
+        if hasattr(self.i2c, 'readfrom_mem_into'):
+            self.i2c.readfrom_mem_into(self.addr, reg, buf)
+        else:
+            buf[:] = bytes(self.i2c.readfrom_mem(self.addr, reg, len(buf)))
+
     def _read8(self, reg):
         t = self.i2c.readfrom_mem(self.addr, reg, 1)
         return t[0]
@@ -73,29 +106,111 @@ class PiicoDev_BME280:
         else:
             return dat
 
-    def read_raw_data(self):
+    def _oversampling(self, mode):
+        return 1 << (mode - 1) if mode in [1, 2, 3, 4, 5] else 0
+
+    def measurement_time_ms(self):
+        """ Return the maximum conversion time in ms for the current oversampling settings (datasheet section 9.1). """
+        t = 1.25 + 2.3 * self._oversampling(self.t_mode)
+        if self._oversampling(self.p_mode):
+            t += 2.3 * self._oversampling(self.p_mode) + 0.575
+        if self._oversampling(self.h_mode):
+            t += 2.3 * self._oversampling(self.h_mode) + 0.575
+        return t
+
+    def _measurement_charge(self):
+        """ Return the charge used by a single conversion in uA.ms. """
+        q = (1.25 + 2.3 * self._oversampling(self.t_mode)) * _TEMPERATURE_UA
+        if self._oversampling(self.p_mode):
+            q += (2.3 * self._oversampling(self.p_mode) + 0.575) * _PRESSURE_UA
+        if self._oversampling(self.h_mode):
+            q += (2.3 * self._oversampling(self.h_mode) + 0.575) * _HUMIDITY_UA
+        return q
+
+    def estimate_forced_mode(self, read_period_s):
+        """ Return (latency in ms, average current in uA) when a forced conversion is started every read_period_s. """
+        return (self.measurement_time_ms(), self._measurement_charge() / (read_period_s * 1000) + _SLEEP_UA)
+
+    def estimate_normal_mode(self, standby_ms):
+        """ Return (latency in ms, average current in uA) when free-running in normal mode with the given standby time. """
+        cycle_ms = self.measurement_time_ms() + standby_ms
+        return (0, self._measurement_charge() / cycle_ms + _STANDBY_UA)
+
+    def standby_times_ms(self):
+        """ Return the standby times supported in normal mode. """
+        return _STANDBY_MS
+
+    def set_normal_mode(self, standby_ms):
+        """ Free-run the sensor, converting every standby_ms (one of standby_times_ms()) using the iir filter.
+            A reading is then just a fetch of the latest results.
+        """
+        self._normal_mode = True
+        self._standby = _STANDBY_MS.index(standby_ms)
+        self._write8(0xF4, self.p_mode << 5 | self.t_mode << 2)     # Config can only be written in sleep mode
+        self._write8(0xF5, self._standby << 5 | self.iir << 2)
+        self._write8(0xF4, self.p_mode << 5 | self.t_mode << 2 | 3)
+
+    def set_oversampling(self, t_mode, p_mode, h_mode):
+        """ Set the oversampling mode of each measurement (0=skipped, 1-5=x1 to x16).
+            Skipped measurements aren't converted, which shortens the conversion time and saves energy.
+            Temperature must be measured to compensate pressure and humidity.
+        """
+        if (t_mode, p_mode, h_mode) == (self.t_mode, self.p_mode, self.h_mode):
+            return
+        self.t_mode = t_mode
+        self.p_mode = p_mode
+        self.h_mode = h_mode
+        self._write8(0xF2, self.h_mode)     # Only takes effect after the next write to 0xF4
+        if self._normal_mode:
+            self.set_normal_mode(_STANDBY_MS[self._standby])
+        else:
+            self._write8(0xF4, self.p_mode << 5 | self.t_mode << 2)
+
+    def set_forced_mode(self):
+        """ Put the sensor to sleep between readings, starting a conversion for each reading (the default). """
+        self._normal_mode = False
+        self._write8(0xF4, self.p_mode << 5 | self.t_mode << 2)
+        self._write8(0xF5, self.iir << 2)
+
+    def start_measurement(self):
+        """ Start a conversion. Returns the number of ms to wait before calling collect().
+            In normal mode the sensor is free-running, so there is no need to wait.
+        """
+        if self._normal_mode:
+            return 0
         self._write8(0xF4, (self.p_mode << 5 | self.t_mode << 2 | 1))
-        sleep_time = 1250
-        if self.t_mode in [1, 2, 3, 4, 5]:
-            sleep_time += 2300*(1<< self.t_mode)
-        if self.p_mode in [1, 2, 3, 4, 5]:
-            sleep_time += 575+(2300*(1<<self.p_mode))
-        if self.h_mode in [1, 2, 3, 4, 5]:
-            sleep_time += 575+(2300*(1<<self.h_mode))
-        sleep_ms(1+sleep_time//1000)
-        while(self._read16(0xF3) & 0x08):
-            sleep_ms(1)
-        raw_p = ((self._read8(0xF7)<<16)|(self._read8(0xF8)<<8)|self._read8(0xF9))>>4
-        raw_t = ((self._read8(0xFA)<<16)|(self._read8(0xFB)<<8)|self._read8(0xFC))>>4
-        raw_h = (self._read8(0xFD) << 8)| self._read8(0xFE)
+        return 1 + int(self.measurement_time_ms())
+
+    def collect(self):
+        """ Return the raw (temperature, pressure, humidity) readings, or None if the conversion is still in progress. """
+        if not self._normal_mode and self._read8(0xF3) & 0x08:
+            return None
+        d = self._data
+        self._read_into(0xF7, d)
+        raw_p = ((d[0]<<16)|(d[1]<<8)|d[2])>>4
+        raw_t = ((d[3]<<16)|(d[4]<<8)|d[5])>>4
+        raw_h = (d[6] << 8)| d[7]
         return (raw_t, raw_p, raw_h)
 
+    def read_raw_data(self):
+        sleep_ms(self.start_measurement())
+        raw = self.collect()
+        while raw == None:
+            sleep_ms(1)
+            raw = self.collect()
+        return raw
+
     def read_compensated_data(self):
         try:
-            raw_t, raw_p, raw_h = self.read_raw_data()
+            raw = self.read_raw_data()
         except:
             print(i2c_err_str.format(self.addr))
             return (float('NaN'), float('NaN'), float('NaN'))
+        return self.compensate(raw)
+
+    def compensate(self, raw):
+        """ Convert raw readings returned by collect() to (temperature in C/100, pressure in Pa/256, humidity in %RH/1024). """
+        raw_t, raw_p, raw_h = raw
         var1 = ((raw_t>>3)-(self._T1<<1))*(self._T2>>11)
         var2 = (raw_t >> 4)-self._T1
         var2 = var2*((raw_t>>4)-self._T1)
@@ -128,9 +243,17 @@ class PiicoDev_BME280:
         humi = h>>12
         return (temp, pres, humi)
 
+    def _scale(self, temp, pres, humi):
+        nan = float('NaN')
+        return (temp/100 if self.t_mode else nan, pres/256 if self.p_mode else nan, humi/1024 if self.h_mode else nan)
+
     def values(self):
-        temp, pres, humi = self.read_compensated_data()
-        return (temp/100, pres/256,  humi/1024)
+        """ Return (temperature in C, pressure in Pa, humidity in %RH). Skipped measurements are NaN. """
+        return self._scale(*self.read_compensated_data())
+
+    def values_from_raw(self, raw):
+        """ Same as values(), but for raw readings returned by collect(). """
+        return self._scale(*self.compensate(raw))
 
     def pressure_precision(self):
         p = self.read_compensated_data()[1]
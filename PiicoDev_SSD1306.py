@@ -31,6 +31,9 @@ _SET_VCOM_DESEL = 0xDB
 _SET_CHARGE_PUMP = 0x8D
 WIDTH = 128
 HEIGHT = 64
+_CMD_BYTES = 3          # I2C bytes to send a command: address, control byte, command
+_DATA_HEADER_BYTES = 2  # I2C bytes before the data: address, control byte
+_WINDOW_OVERHEAD = 6 * _CMD_BYTES + _DATA_HEADER_BYTES     # I2C bytes to send a window, in addition to its data
 
 from PiicoDev_Unified import *
 from math import cos,sin,radians
@@ -42,40 +45,77 @@ _SYSNAME = os.uname().sysname
 if _SYSNAME == 'microbit':
     from microbit import *
     from utime import sleep_ms
-    from ustruct import pack_into
+    numpy = None
 elif _SYSNAME == 'Linux':
-    from struct import pack_into
+    try:
+        import numpy    # Optional, speeds up drawing runs of partial bytes
+    except ImportError:
+        numpy = None
 else:
     import framebuf
     
 if _SYSNAME == 'microbit' or _SYSNAME == 'Linux':
+    # The framebuffer works directly on the MONO_VLSB buffer with the same semantics as MicroPython's framebuf:
+    # drawing is clipped to the display and never touches the bus (show() sends the buffer).
+    # Whole bytes are written by slice assignment. A run of bytes which only have some of their bits drawn
+    # is updated as a single integer, or with NumPy when it is installed.
+    _PAGE_ROWS = (bytes(WIDTH), b'\xff' * WIDTH)   # A full page width of each colour, copied by slice assignment
+
     class framebuf:
         class FrameBuffer():
                 #Framebuffer manipulation, used by Microbit and Linux
-            def _set_pos(self, col=0, page=0):
-                self.write_cmd(0xb0 | page)  # page number
-                # take upper and lower value of col * 2
-                c1, c2 = col * 2 & 0x0F, col >> 3
-                self.write_cmd(0x00 | c1)  # lower start column address
-                self.write_cmd(0x10 | c2)  # upper start column address
-                
-            def fill(self, c=0):
-                for i in range(0, 1024):
-                    if c > 0:
-                        self.buffer[i] = 0xFF
+            _pixels = None  # NumPy (pages, WIDTH) view of the buffer
+
+            def _get_pixels(self):
+                if self._pixels is None and numpy:
+                    self._pixels = numpy.frombuffer(self.buffer, dtype=numpy.uint8).reshape(len(self.buffer) // WIDTH, WIDTH)
+                return self._pixels
+
+            def _fill_span(self, page, x0, x1, mask, c):
+                # Set (c != 0) or clear the bits in mask of columns x0 to x1 - 1 of a page.
+                buffer = self.buffer
+                start = page * WIDTH + x0
+                n = x1 - x0
+                if mask == 0xFF:
+                    buffer[start:start + n] = memoryview(_PAGE_ROWS[1 if c else 0])[:n]
+                    return
+                pixels = self._get_pixels()
+                if pixels is not None:
+                    if c:
+                        pixels[page, x0:x1] |= mask
                     else:
-                        self.buffer[i] = 0x00
+                        pixels[page, x0:x1] &= ~mask & 0xFF
+                    return
+                ones = (1 << (n << 3)) - 1
+                pattern = ones // 0xFF * mask   # mask repeated in each byte
+                bits = int.from_bytes(buffer[start:start + n], 'little')
+                bits = bits | pattern if c else bits & (ones ^ pattern)
+                buffer[start:start + n] = bits.to_bytes(n, 'little')
+
+            def fill(self, c=0):
+                row = _PAGE_ROWS[1 if c else 0]
+                for start in range(0, len(self.buffer), WIDTH):
+                    self.buffer[start:start + WIDTH] = row
                         
-            def pixel(self, x, y, color):
-                x = x & (WIDTH - 1)
-                y = y & (HEIGHT - 1)
-                page, shift_page = divmod(y, 8)
-                ind = x + page * 128
-                b = self.buffer[ind] | (1 << shift_page) if color else self.buffer[ind] & ~ (1 << shift_page)
-                pack_into(">B", self.buffer, ind, b)
-                self._set_pos(x, page)
+            def pixel(self, x, y, c=None):
+                if x < 0 or x >= WIDTH or y < 0 or y >= HEIGHT:
+                    return None
+                ind = (y >> 3) * WIDTH + x
+                if c is None:
+                    return self.buffer[ind] >> (y & 7) & 1
+                if c:
+                    self.buffer[ind] |= 1 << (y & 7)
+                else:
+                    self.buffer[ind] &= ~(1 << (y & 7))
 
             def line(self, x1, y1, x2, y2, c):
+                if y1 == y2:
+                    self.hline(min(x1, x2), y1, abs(x2 - x1) + 1, c)
+                    return
+                if x1 == x2:
+                    self.vline(x1, min(y1, y2), abs(y2 - y1) + 1, c)
+                    return
+
                 # bresenham
                 steep = abs(y2-y1) > abs(x2-x1)
                 
@@ -120,20 +160,41 @@ if _SYSNAME == 'microbit' or _SYSNAME == 'Linux':
                     x1 += 1        
          
             def hline(self, x, y, l, c):
-                self.line(x, y, x + l, y, c)
+                self.fill_rect(x, y, l, 1, c)
                 
             def vline(self, x, y, h, c):
-                self.line(x, y, x, y + h, c)
+                y0 = max(y, 0)
+                y1 = min(y + h, HEIGHT)
+                if x < 0 or x >= WIDTH or y0 >= y1:
+                    return
+                # Write the bits of the line in each page it crosses
+                for page in range(y0 >> 3, ((y1 - 1) >> 3) + 1):
+                    mask = (0xFF << max(y0 - page * 8, 0)) & (0xFF >> max(page * 8 + 8 - y1, 0))
+                    if c:
+                        self.buffer[page * WIDTH + x] |= mask
+                    else:
+                        self.buffer[page * WIDTH + x] &= ~mask
                 
-            def rect(self, x, y, w, h, c):
+            def rect(self, x, y, w, h, c, f=False):
+                if f:
+                    self.fill_rect(x, y, w, h, c)
+                    return
                 self.hline(x, y, w, c)
-                self.hline(x, y+h, w, c)
+                self.hline(x, y + h - 1, w, c)
                 self.vline(x, y, h, c)
-                self.vline(x+w, y, h, c)
+                self.vline(x + w - 1, y, h, c)
                           
             def fill_rect(self, x, y, w, h, c):
-                for i in range(y, y + h):
-                    self.hline(x, i, w, c)
+                x0 = max(x, 0)
+                x1 = min(x + w, WIDTH)
+                y0 = max(y, 0)
+                y1 = min(y + h, HEIGHT)
+                if x0 >= x1 or y0 >= y1:
+                    return
+                # Fill the bits of the rectangle in each page it crosses
+                for page in range(y0 >> 3, ((y1 - 1) >> 3) + 1):
+                    mask = (0xFF << max(y0 - page * 8, 0)) & (0xFF >> max(page * 8 + 8 - y1, 0))
+                    self._fill_span(page, x0, x1, mask, c)
                     
             def text(self, text, x, y, c=1):
                 fontFile = open("font-pet-me-128.dat", "rb")
@@ -157,6 +218,8 @@ class PiicoDev_SSD1306(framebuf.FrameBuffer):
         self.height = HEIGHT
         self.pages = HEIGHT // 8
         self.buffer = bytearray(self.pages * WIDTH)
+        self._shown = None      # Copy of the buffer as last sent to the display, None until the whole buffer has been sent
+        self.i2c_bytes = 0      # Number of bytes sent over the I2C bus (including address and control bytes)
         for cmd in (
             _SET_DISP,  # display off
             # address setting
@@ -211,17 +274,75 @@ class PiicoDev_SSD1306(framebuf.FrameBuffer):
         self.write_cmd(_SET_SEG_REMAP | (rotate & 1))
 
     def show(self):
-        x0 = 0
-        x1 = WIDTH - 1
+        # Only send the parts of the buffer which have changed since they were last sent, as the I2C bus is shared.
+        # Each run of changed pages is sent as a single window covering the changed columns.
+        if self._shown == None:
+            self._write_window(0, self.pages - 1, 0, WIDTH - 1)
+            return
+        window = None   # [first page, last page, first column, last column]
+        for page in range(self.pages):
+            columns = self._dirty_columns(page)
+            if columns == None:
+                continue
+            if window and window[1] == page - 1:
+                # Extend the window to this page, if that sends no more bytes than a separate window would.
+                x0 = min(window[2], columns[0])
+                x1 = max(window[3], columns[1])
+                separate = (page - window[0]) * (window[3] - window[2] + 1) + columns[1] - columns[0] + 1 + _WINDOW_OVERHEAD
+                if (page - window[0] + 1) * (x1 - x0 + 1) <= separate:
+                    window = [window[0], page, x0, x1]
+                    continue
+            if window:
+                self._write_window(*window)
+            window = [page, page, columns[0], columns[1]]
+        if window:
+            self._write_window(*window)
+
+    def invalidate(self):
+        # Send the whole buffer on the next show(), e.g. if the display contents may have been lost.
+        self._shown = None
+
+    def _dirty_columns(self, page):
+        # Return the first and last columns of the page which have changed since they were last sent, or None if none have.
+        start = page * WIDTH
+        end = start + WIDTH - 1
+        buffer = self.buffer
+        shown = self._shown
+        if buffer[start:end + 1] == shown[start:end + 1]:
+            return None
+        while buffer[start] == shown[start]:
+            start += 1
+        while buffer[end] == shown[end]:
+            end -= 1
+        return start - page * WIDTH, end - page * WIDTH
+
+    def _write_window(self, page0, page1, x0, x1):
         self.write_cmd(_SET_COL_ADDR)
         self.write_cmd(x0)
         self.write_cmd(x1)
         self.write_cmd(_SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        self.write_cmd(page0)
+        self.write_cmd(page1)
+        if x0 == 0 and x1 == WIDTH - 1:
+            if page0 == 0 and page1 == self.pages - 1:
+                data = self.buffer
+            else:
+                data = self.buffer[page0 * WIDTH:(page1 + 1) * WIDTH]
+        else:
+            data = bytearray()
+            for page in range(page0, page1 + 1):
+                data.extend(self.buffer[page * WIDTH + x0:page * WIDTH + x1 + 1])
+        self.write_data(data)
+        if self.comms_err:
+            return
+        if self._shown == None:
+            self._shown = bytearray(self.buffer)
+        else:
+            for page in range(page0, page1 + 1):
+                self._shown[page * WIDTH + x0:page * WIDTH + x1 + 1] = self.buffer[page * WIDTH + x0:page * WIDTH + x1 + 1]
         
     def write_cmd(self, cmd):
+        self.i2c_bytes += _CMD_BYTES
         try:
             self.i2c.writeto_mem(self.addr, int.from_bytes(b'\x80','big'), bytes([cmd]))
             self.comms_err = False
@@ -230,6 +351,7 @@ class PiicoDev_SSD1306(framebuf.FrameBuffer):
             self.comms_err = True
             
     def write_data(self, buf):
+        self.i2c_bytes += _DATA_HEADER_BYTES + len(buf)
         try:
             self.write_list[1] = buf
             self.i2c.writeto_mem(self.addr, int.from_bytes(self.write_list[0],'big'), self.write_list[1])
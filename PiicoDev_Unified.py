@@ -64,6 +64,7 @@ class I2CUnifiedMachine(I2CBase):
 
         self.writeto_mem = self.i2c.writeto_mem
         self.readfrom_mem = self.i2c.readfrom_mem
+        self.readfrom_mem_into = self.i2c.readfrom_mem_into
 
     def write8(self, addr, reg, data):
         if reg is None:
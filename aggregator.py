@@ -0,0 +1,119 @@
+# Aggregator class
+#
+# Copyright (C) Mark Gladding 2023.
+#
+# MIT License (see the accompanying license file)
+#
+# https://github.com/mark-gladding/weatherstation
+#
+
+from array import array
+from sensor import MEASURES
+
+VALUES_PER_READING = len(MEASURES) * 4      # min, mean, max and count of each measure
+_NO_READINGS = ()
+
+class Aggregator:
+    """Class aggregating sensor readings into fixed time buckets, as an alternative to uploading every reading.
+
+     For each bucket, the min, mean, max and count of each measure is emitted as a single reading, timestamped
+     with the start of the bucket. The bucket size depends on whether it is day or night. While the bucket size is 0,
+     each reading is passed through in the same layout (a count of 1), so aggregating only at night is possible.
+     Each reading is accumulated in constant time, without allocating memory.
+    """
+    def __init__(self, ntptime, day_bucket_s : int, night_bucket_s : int):
+        """Constructor
+
+        Args:
+            ntptime (NtpTime): Used to determine whether it is day or night.
+            day_bucket_s (int): Bucket size in seconds during the day (0 = pass readings through).
+            night_bucket_s (int): Bucket size in seconds during the night (0 = pass readings through).
+        """
+        self._ntptime = ntptime
+        self._day_bucket_s = day_bucket_s
+        self._night_bucket_s = night_bucket_s
+        count = len(MEASURES)
+        self._min = array('f', [0] * count)
+        self._max = array('f', [0] * count)
+        self._sum = array('f', [0] * count)
+        self._count = array('H', [0] * count)
+        self._bucket_start = None
+        self._bucket_end = 0
+
+    def _start_bucket(self, t, bucket_s):
+        start = t - t % bucket_s
+        end = start + bucket_s
+        # After a change of bucket size, start at the first reading rather than overlapping the previous bucket, so the bucket times are unique.
+        if start < self._bucket_end <= t:
+            start = t
+        self._bucket_start = start
+        self._bucket_end = end
+        for i in range(len(MEASURES)):
+            self._count[i] = 0
+
+    def _bucket_reading(self):
+        """ Return the reading for the current bucket as a tuple of (bucket_start, tempC_min, tempC_mean, tempC_max, tempC_count, pres_hPa_min, ...).
+            Measures with no samples are NaN.
+        """
+        values = []
+        nan = float('NaN')
+        for i in range(len(MEASURES)):
+            count = self._count[i]
+            if count:
+                values.extend((self._min[i], self._sum[i] / count, self._max[i], count))
+            else:
+                values.extend((nan, nan, nan, nan))
+        return tuple([self._bucket_start] + values)
+
+    def _single_reading(self, t, tempC, pres_hPa, humRH):
+        """ Return a reading passed through in the aggregated layout, i.e. with a count of 1 (or NaN if not sampled). """
+        values = [t]
+        for value in (tempC, pres_hPa, humRH):
+            if value != value:
+                values.extend((value, value, value, value))
+            else:
+                values.extend((value, value, value, 1))
+        return tuple(values)
+
+    def _accumulate(self, i, value):
+        if value != value:      # NaN, i.e. not sampled
+            return
+        if self._count[i]:
+            if value < self._min[i]:
+                self._min[i] = value
+            if value > self._max[i]:
+                self._max[i] = value
+            self._sum[i] += value
+        else:
+            self._min[i] = value
+            self._max[i] = value
+            self._sum[i] = value
+        self._count[i] += 1
+
+    def add(self, current_time, tempC, pres_hPa, humRH):
+        """ Add a reading. Returns the list of aggregated readings to queue for upload,
+            which is empty unless the reading is in a new bucket or is passed through.
+        """
+        t = int(current_time)
+        bucket_s = self._day_bucket_s if self._ntptime.is_day() else self._night_bucket_s
+        readings = _NO_READINGS
+        if self._bucket_start != None and (bucket_s == 0 or t >= self._bucket_end or t < self._bucket_start):
+            readings = [self._bucket_reading()]
+            self._bucket_start = None
+        if bucket_s == 0:
+            self._bucket_end = t + 1
+            return list(readings) + [self._single_reading(t, tempC, pres_hPa, humRH)]
+        if self._bucket_start == None:
+            self._start_bucket(t, bucket_s)
+        self._accumulate(0, tempC)
+        self._accumulate(1, pres_hPa)
+        self._accumulate(2, humRH)
+        return readings
+
+    def flush(self):
+        """ Emit the current (partial) bucket, e.g. before a reset. Returns the list of aggregated readings to queue for upload. """
+        if self._bucket_start == None:
+            return _NO_READINGS
+        readings = [self._bucket_reading()]
+        self._bucket_start = None
+        return readings
@@ -12,7 +12,7 @@ def sign(key, msg):
     """
     Copied from https://docs.aws.amazon.com/general/latest/gr/sigv4-signed-request-examples.html
     """
-    return hmac.digest(key, msg.encode('utf-8'), hashlib.sha256)
+    return hmac.HMACKey(key, hashlib.sha256).digest(msg.encode('utf-8'))
 
 
 def getSignatureKey(key, dateStamp, regionName, serviceName):
@@ -53,6 +53,9 @@ class AWSRequestsAuth:
 
         The aws_token is optional and is used only if you are using STS
         temporary credentials.
+
+        The signing key doesn't depend on the host, so one instance can sign requests to several hosts of a service
+        (e.g. the cell endpoints returned by DescribeEndpoints) by passing the host of each request.
         """
         self.aws_access_key = aws_access_key
         self.aws_secret_access_key = aws_secret_access_key
@@ -61,13 +64,43 @@ class AWSRequestsAuth:
         self.service = aws_service
         self.aws_token = aws_token
 
-    def get_aws_request_headers(self, method, url, rbody):
-        return self._get_aws_request_headers(method=method, url=url, rbody=rbody,
+        # Precompute the parts of the canonical request and credential scope which never change.
+        # Header names and value must be trimmed and lowercase, and sorted in ASCII order.
+        # "Host" and "x-amz-date" are always required.
+        self._signed_headers = 'host;x-amz-date'
+        self._token_header = ''
+        if aws_token:
+            self._token_header = 'x-amz-security-token:' + aws_token + '\n'
+            self._signed_headers += ';x-amz-security-token'
+        self._scope_suffix = '/' + aws_region + '/' + aws_service + '/aws4_request'
+
+        # The signing key only changes once per day, so cache it against the date it was derived for.
+        self._signing_datestamp = None
+        self._signing_hmac = None
+
+    def get_aws_request_headers(self, method, url, rbody, payload_hash=None, host=None):
+        """
+        payload_hash is the hex SHA-256 hash of the body, if it has already been calculated (e.g. for a streamed body).
+        rbody is then ignored.
+        host is the host the request is sent to, if it isn't aws_host.
+        """
+        return self._get_aws_request_headers(method=method, url=url, rbody=rbody, host=host or self.aws_host,
                                             aws_access_key=self.aws_access_key,
                                             aws_secret_access_key=self.aws_secret_access_key,
-                                            aws_token=self.aws_token)
+                                            aws_token=self.aws_token,
+                                            payload_hash=payload_hash)
 
-    def _get_aws_request_headers(self, method, url, rbody, aws_access_key, aws_secret_access_key, aws_token):
+    def _get_signing_key(self, aws_secret_access_key, datestamp):
+        """
+        Return the HMAC key schedule of the signing key for the given date, deriving it only when the date changes.
+        """
+        if datestamp != self._signing_datestamp:
+            signing_key = getSignatureKey(aws_secret_access_key, datestamp, self.aws_region, self.service)
+            self._signing_hmac = hmac.HMACKey(signing_key, hashlib.sha256)
+            self._signing_datestamp = datestamp
+        return self._signing_hmac
+
+    def _get_aws_request_headers(self, method, url, rbody, host, aws_access_key, aws_secret_access_key, aws_token, payload_hash=None):
         """
         Returns a dictionary containing the necessary headers for Amazon's
         signature version 4 signing process. An example return value might
@@ -82,77 +115,48 @@ class AWSRequestsAuth:
         """
         # Create a date for headers and the credential string
         t = time.gmtime()
-        amzdate = f'{t[0]}{t[1]:02d}{t[2]:02d}T{t[3]:02d}{t[4]:02d}{t[5]:02d}Z'
         datestamp = f'{t[0]}{t[1]:02d}{t[2]:02d}'  # Date w/o time for credential_scope
+        amzdate = f'{datestamp}T{t[3]:02d}{t[4]:02d}{t[5]:02d}Z'
 
-        canonical_uri = '/' # AWSRequestsAuth.get_canonical_path(r)
-
-        canonical_querystring = '' # AWSRequestsAuth.get_canonical_querystring(r)
+        # The canonical uri is always '/' and the canonical querystring is always empty.
+        canonical_request_prefix = method + '\n/\n\nhost:' + host + '\n'
 
-        # Create the canonical headers and signed headers. Header names
-        # and value must be trimmed and lowercase, and sorted in ASCII order.
-        # Note that there is a trailing \n.
-        canonical_headers = ('host:' + self.aws_host + '\n' +
-                             'x-amz-date:' + amzdate + '\n')
-        if aws_token:
-            canonical_headers += 'x-amz-security-token:' + aws_token + '\n'
-
-        # Create the list of signed headers. This lists the headers
-        # in the canonical_headers list, delimited with ";" and in alpha order.
-        # Note: The request can include any headers; canonical_headers and
-        # signed_headers lists those that you want to be included in the
-        # hash of the request. "Host" and "x-amz-date" are always required.
-        signed_headers = 'host;x-amz-date'
-        if aws_token:
-            signed_headers += ';x-amz-security-token'
+        # Create the canonical headers. Note that there is a trailing \n.
+        canonical_headers = 'x-amz-date:' + amzdate + '\n' + self._token_header
 
         # Create payload hash (hash of the request body content). For GET
         # requests, the payload is an empty string ('').
-        body = rbody if rbody else bytes()
-        try:
-            body = body.encode('utf-8')
-        except (AttributeError, UnicodeDecodeError):
-            # On py2, if unicode characters in present in `body`,
-            # encode() throws UnicodeDecodeError, but we can safely
-            # pass unencoded `body` to execute hexdigest().
-            #
-            # For py3, encode() will execute successfully regardless
-            # of the presence of unicode data
-            body = body
-
-        payload_hash = binascii.hexlify(hashlib.sha256(body).digest()).decode('utf-8')
+        if not payload_hash:
+            body = rbody if rbody else bytes()
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+
+            payload_hash = binascii.hexlify(hashlib.sha256(body).digest()).decode('utf-8')
 
         # Combine elements to create create canonical request
-        canonical_request = (method + '\n' + canonical_uri + '\n' +
-                             canonical_querystring + '\n' + canonical_headers +
-                             '\n' + signed_headers + '\n' + payload_hash)
+        canonical_request = (canonical_request_prefix + canonical_headers +
+                             '\n' + self._signed_headers + '\n' + payload_hash)
 
         # Match the algorithm to the hashing algorithm you use, either SHA-1 or
         # SHA-256 (recommended)
         algorithm = 'AWS4-HMAC-SHA256'
-        credential_scope = (datestamp + '/' + self.aws_region + '/' +
-                            self.service + '/' + 'aws4_request')
+        credential_scope = datestamp + self._scope_suffix
         string_to_sign = (algorithm + '\n' + amzdate + '\n' + credential_scope +
                           '\n' + binascii.hexlify(hashlib.sha256(canonical_request.encode('utf-8')).digest()).decode('utf-8'))
 
-        # Create the signing key using the function defined above.
-        signing_key = getSignatureKey(aws_secret_access_key,
-                                      datestamp,
-                                      self.aws_region,
-                                      self.service)
+        # Get the (cached) signing key for today.
+        signing_hmac = self._get_signing_key(aws_secret_access_key, datestamp)
 
         # Sign the string_to_sign using the signing_key
         string_to_sign_utf8 = string_to_sign.encode('utf-8')
-        signature = binascii.hexlify(hmac.digest(signing_key,
-                             string_to_sign_utf8,
-                             hashlib.sha256)).decode('utf-8')
+        signature = binascii.hexlify(signing_hmac.digest(string_to_sign_utf8)).decode('utf-8')
 
         # The signing information can be either in a query string value or in
         # a header named Authorization. This code shows how to use a header.
         # Create authorization header and add to request headers
         authorization_header = (algorithm + ' ' + 'Credential=' + aws_access_key +
                                 '/' + credential_scope + ', ' + 'SignedHeaders=' +
-                                signed_headers + ', ' + 'Signature=' + signature)
+                                self._signed_headers + ', ' + 'Signature=' + signature)
 
         headers = {
             'Authorization': authorization_header,
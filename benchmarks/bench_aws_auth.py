@@ -0,0 +1,61 @@
+# Benchmark of SigV4 request signing (aws_auth.AWSRequestsAuth), under CPython.
+#
+#   python benchmarks/bench_aws_auth.py
+#
+# Compares the cached signer with the previous path, which derived the signing key and built the whole canonical request
+# for every request. The clock is fixed, so both must produce identical headers.
+
+import binascii
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import aws_auth
+import hashlib
+import hmac     # The repository's hmac module, as used on the Pico
+
+_FIXED_TIME = (2023, 6, 18, 22, 4, 5, 6, 169, 0)
+_HOST = 'ingest-cell2.timestream.ap-southeast-2.amazonaws.com'
+_BODY = '{"DatabaseName": "WeatherDb", "TableName": "Weather", "Records": [' + ', '.join(
+    ['{"MeasureName": "temperature", "MeasureValue": "21.37", "Time": "1700000000", "Version": 1700000000000}'] * 30) + ']}'
+
+def _sign(key, msg):
+    return hmac.digest(key, msg.encode('utf-8'), hashlib.sha256)
+
+def uncached_headers(access_key, secret_key, host, region, service, body):
+    """ The signing path before the signing key and static fragments were cached. """
+    t = time.gmtime()
+    datestamp = f'{t[0]}{t[1]:02d}{t[2]:02d}'
+    amzdate = f'{datestamp}T{t[3]:02d}{t[4]:02d}{t[5]:02d}Z'
+    canonical_headers = 'host:' + host + '\n' + 'x-amz-date:' + amzdate + '\n'
+    signed_headers = 'host;x-amz-date'
+    payload_hash = binascii.hexlify(hashlib.sha256(body.encode('utf-8')).digest()).decode('utf-8')
+    canonical_request = 'POST\n/\n\n' + canonical_headers + '\n' + signed_headers + '\n' + payload_hash
+    algorithm = 'AWS4-HMAC-SHA256'
+    credential_scope = datestamp + '/' + region + '/' + service + '/' + 'aws4_request'
+    string_to_sign = (algorithm + '\n' + amzdate + '\n' + credential_scope + '\n' +
+                      binascii.hexlify(hashlib.sha256(canonical_request.encode('utf-8')).digest()).decode('utf-8'))
+    k_signing = _sign(_sign(_sign(_sign(('AWS4' + secret_key).encode('utf-8'), datestamp), region), service), 'aws4_request')
+    signature = binascii.hexlify(hmac.digest(k_signing, string_to_sign.encode('utf-8'), hashlib.sha256)).decode('utf-8')
+    authorization_header = (algorithm + ' ' + 'Credential=' + access_key + '/' + credential_scope + ', ' +
+                            'SignedHeaders=' + signed_headers + ', ' + 'Signature=' + signature)
+    return {'Authorization': authorization_header, 'x-amz-date': amzdate, 'x-amz-content-sha256': payload_hash}
+
+def main():
+    time.gmtime = lambda *args: _FIXED_TIME
+    auth = aws_auth.AWSRequestsAuth('AKIDEXAMPLE', 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY', _HOST, 'ap-southeast-2', 'timestream')
+    cached = lambda: auth.get_aws_request_headers('POST', 'https://' + _HOST + '/', _BODY)
+    uncached = lambda: uncached_headers('AKIDEXAMPLE', 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY', _HOST, 'ap-southeast-2', 'timestream', _BODY)
+    if cached() != uncached():
+        sys.exit('The cached signer produced different headers.')
+    print(f'Python {sys.version.split()[0]}, {len(_BODY)} byte body, headers identical')
+    results = {}
+    for name, function in (('previous (key derived per request)', uncached), ('cached signer', cached)):
+        results[name] = min(timeit.repeat(function, number=2000, repeat=5)) / 2000
+        print(f'{name:36s} {results[name] * 1e6:8.1f} us per request')
+    print(f'speedup {results["previous (key derived per request)"] / results["cached signer"]:.1f}x')
+
+if __name__ == '__main__':
+    main()
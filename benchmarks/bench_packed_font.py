@@ -0,0 +1,74 @@
+# Benchmark of packed font text rendering on the framebuffer used on Linux (and micro:bit), under CPython.
+#
+#   python benchmarks/bench_packed_font.py
+#
+# Compares packed_font.text, which ORs precomputed column masks into the display buffer (a blit on MicroPython),
+# with the previous renderer, which visited every bit of each character and called display.pixel() for each set bit.
+# Both must leave the display buffer byte-identical.
+
+import os
+import sys
+import timeit
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+os.chdir(_ROOT)     # Fonts are loaded from the current directory
+import packed_font
+import PiicoDev_SSD1306
+
+_STRINGS = [
+    ('digits-30', '18.5°'),
+    ('text-16', '12:34'),
+    ('text-16', 'Outside'),
+]
+
+class _I2C:
+    def writeto_mem(self, addr, memaddr, buf):
+        pass
+
+def per_pixel_text(display, text, x, y, c=1):
+    """ The previous renderer, without alignment. """
+    font = packed_font._current_font
+    characters = font['characters']
+    default_character = font['default_character']
+    data = font['data']
+    for char in text:
+        try:
+            char_definition = characters[char]
+        except KeyError:
+            char_definition = characters[default_character]
+        start_index = char_definition['start_index']
+        width = char_definition['char_width']
+        height = char_definition['char_height']
+        width_in_bytes = int((width + 7) / 8)
+        for i in range(height):
+            for j in range(width):
+                byte_index = int(j / 8)
+                bit_index = j - byte_index * 8
+                val = data[start_index + i * width_in_bytes + byte_index ]
+                if (val >> (7-bit_index)) & 1:
+                    display.pixel(x + j, y + i, c)
+        x += width
+
+def main():
+    PiicoDev_SSD1306.create_unified_i2c = lambda **kwargs: _I2C()
+    display = PiicoDev_SSD1306.PiicoDev_SSD1306_Linux()
+    print(f'{"framebuf" if packed_font.framebuf else "Column mask"} path, Python {sys.version.split()[0]}')
+    for font_name, text in _STRINGS:
+        packed_font.load_font(font_name)
+        packed_font.select_font(font_name)
+        results = []
+        for render in (per_pixel_text, packed_font.text):
+            display.fill(0)
+            render(display, text, 3, 5)
+            results.append(bytes(display.buffer))
+        if results[0] != results[1]:
+            sys.exit(f'{font_name} {text!r} was rendered differently.')
+        times = []
+        for render in (per_pixel_text, packed_font.text):
+            times.append(min(timeit.repeat(lambda: render(display, text, 3, 5), number=200, repeat=5)) / 200)
+        print(f'{font_name:10s} {text!r:10s} per-pixel {times[0] * 1e6:7.1f} us   '
+              f'column masks {times[1] * 1e6:6.1f} us   (x{times[0] / times[1]:.1f})')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# Micro-benchmark of each drawing primitive of the framebuffer used on Linux (and micro:bit), under CPython.
+#
+#   python benchmarks/bench_ssd1306.py [--no-numpy]
+#
+# Prints the time per call of each primitive, and the bytes sent over the I2C bus while drawing (which should be 0).
+# NumPy is used for partial byte runs if it is installed, unless --no-numpy is given.
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if '--no-numpy' in sys.argv:
+    sys.modules['numpy'] = None
+import PiicoDev_SSD1306
+
+class _I2C:
+    def __init__(self):
+        self.bytes = 0
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self.bytes += 2 + len(buf)
+
+_PRIMITIVES = [
+    ('fill(1)', 'display.fill(1)', 200),
+    ('pixel(50, 20, 1)', 'display.pixel(50, 20, 1)', 5000),
+    ('pixel(50, 20)', 'display.pixel(50, 20)', 5000),
+    ('hline(0, 20, 128, 1)', 'display.hline(0, 20, 128, 1)', 500),
+    ('hline(10, 20, 40, 0)', 'display.hline(10, 20, 40, 0)', 500),
+    ('vline(50, 0, 64, 1)', 'display.vline(50, 0, 64, 1)', 500),
+    ('vline(50, 3, 10, 0)', 'display.vline(50, 3, 10, 0)', 500),
+    ('rect(5, 5, 100, 40, 1)', 'display.rect(5, 5, 100, 40, 1)', 200),
+    ('fill_rect(0, 56, 128, 8, 0)', 'display.fill_rect(0, 56, 128, 8, 0)', 200),
+    ('fill_rect(3, 5, 100, 50, 1)', 'display.fill_rect(3, 5, 100, 50, 1)', 200),
+    ('line(0, 0, 127, 63, 1)', 'display.line(0, 0, 127, 63, 1)', 50),
+]
+
+def main():
+    i2c = _I2C()
+    PiicoDev_SSD1306.create_unified_i2c = lambda **kwargs: i2c
+    display = PiicoDev_SSD1306.PiicoDev_SSD1306_Linux()
+    print(f'{"NumPy" if PiicoDev_SSD1306.numpy else "Integer"} path, Python {sys.version.split()[0]}')
+    start_bytes = i2c.bytes
+    for name, statement, number in _PRIMITIVES:
+        seconds = min(timeit.repeat(statement, number=number, repeat=5, globals={'display': display})) / number
+        print(f'{name:32s} {seconds * 1e6:9.2f} us')
+    print(f'I2C bytes sent while drawing: {i2c.bytes - start_bytes}')
+
+if __name__ == '__main__':
+    main()
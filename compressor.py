@@ -0,0 +1,128 @@
+# Compressor class
+#
+# Copyright (C) Mark Gladding 2023.
+#
+# MIT License (see the accompanying license file)
+#
+# https://github.com/mark-gladding/weatherstation
+#
+
+from sensor import MEASURES
+
+class Compressor:
+    """Class providing swinging door compression of sensor readings before they are queued for upload.
+
+     Each measure is compressed independently. A point is only emitted when the measure can no longer be
+     reconstructed, by linear interpolation between the emitted points, to within the measure's tolerance.
+     This includes the deadband case, where a flat series is reduced to its end points.
+     A heartbeat point is also emitted every heartbeat_s seconds, so a reading is never held back for too long.
+     Measures which aren't emitted at a given time are NaN, which Timestream.format_readings drops.
+     The end of a segment is emitted at the time of an earlier reading, so emitted points are held back until every
+     measure has been decided for their time. Each time is therefore only ever returned in a single reading.
+    """
+    def __init__(self, tolerances : dict, heartbeat_s = 900):
+        """Constructor
+
+        Args:
+            tolerances (dict): Maximum reconstruction error of each measure, keyed by 'temperature', 'pressure' and 'humidity'.
+                Measures which are missing (or 0) aren't compressed.
+            heartbeat_s (int or dict, optional): Maximum time in seconds between emitted points, or a dict of the maximum time
+                for each measure, keyed like tolerances (missing measures use 900). Should be several times a measure's sample period,
+                otherwise the measure can't be compressed. Defaults to 900.
+        """
+        self._tolerances = [tolerances.get(name, 0) for name in MEASURES]
+        if isinstance(heartbeat_s, dict):
+            self._heartbeat_s = [heartbeat_s.get(name, 900) for name in MEASURES]
+        else:
+            self._heartbeat_s = [heartbeat_s] * len(MEASURES)
+        self._pending = {}                      # Time -> [value of each measure] of the points emitted, but not yet returned
+        count = len(MEASURES)
+        self._archive_time = [None] * count     # Last emitted point
+        self._archive_value = [0.0] * count
+        self._last_time = [0] * count           # Last point seen since the archived point
+        self._last_value = [0.0] * count
+        self._min_slope = [0.0] * count         # Range of slopes from the archived point which keep every point seen within tolerance
+        self._max_slope = [0.0] * count
+
+    def _archive(self, i, t, value):
+        self._archive_time[i] = t
+        self._archive_value[i] = value
+        self._last_time[i] = t
+        self._last_value[i] = value
+
+    def _close(self, i):
+        """ Emit the end of the current segment, at the time of the last point seen.
+            The slope is clamped to the door, so every point in the segment is within tolerance.
+        """
+        dt = self._last_time[i] - self._archive_time[i]
+        slope = (self._last_value[i] - self._archive_value[i]) / dt
+        slope = min(max(slope, self._min_slope[i]), self._max_slope[i])
+        value = self._archive_value[i] + slope * dt
+        self._archive(i, self._last_time[i], value)
+        return value
+
+    def _emit(self, t, i, value):
+        if t not in self._pending:
+            self._pending[t] = [float('NaN')] * len(MEASURES)
+        self._pending[t][i] = value
+
+    def _is_open(self, i):
+        return self._archive_time[i] != None and self._last_time[i] > self._archive_time[i]
+
+    def _readings(self, flush=False):
+        """ Return the pending points which can no longer change as readings, oldest first.
+            An open segment may still be closed at the time of its last point, so points from then on are held back.
+        """
+        open_times = [self._last_time[i] for i in range(len(MEASURES)) if self._is_open(i)]
+        until = min(open_times) if open_times and not flush else None
+        readings = []
+        for t in sorted(self._pending):
+            if until != None and t >= until:
+                break
+            readings.append(tuple([t] + self._pending.pop(t)))
+        return readings
+
+    def add(self, current_time, tempC, pres_hPa, humRH):
+        """ Add a reading. Returns the list of readings to queue for upload, each a tuple of (current_time, tempC, pres_hPa, humRH).
+            Emitted points may be for the time of an earlier reading.
+        """
+        t = int(current_time)
+        for i, value in enumerate((tempC, pres_hPa, humRH)):
+            if value != value:      # NaN, i.e. not sampled
+                continue
+            tolerance = self._tolerances[i]
+            if not tolerance or self._archive_time[i] == None:
+                self._archive(i, t, value)
+                self._emit(t, i, value)
+                continue
+            if t <= self._last_time[i]:
+                continue
+
+            dt = t - self._archive_time[i]
+            min_slope = (value - tolerance - self._archive_value[i]) / dt
+            max_slope = (value + tolerance - self._archive_value[i]) / dt
+            if self._last_time[i] > self._archive_time[i]:
+                min_slope = max(min_slope, self._min_slope[i])
+                max_slope = min(max_slope, self._max_slope[i])
+                if min_slope > max_slope:
+                    # The door has closed. Start a new segment from the end of the current one.
+                    self._emit(self._last_time[i], i, self._close(i))
+                    dt = t - self._archive_time[i]
+                    min_slope = (value - tolerance - self._archive_value[i]) / dt
+                    max_slope = (value + tolerance - self._archive_value[i]) / dt
+            self._min_slope[i] = min_slope
+            self._max_slope[i] = max_slope
+            self._last_time[i] = t
+            self._last_value[i] = value
+        for i in range(len(MEASURES)):
+            # Also checked for measures which weren't sampled, so they can't hold back the other measures' points for long.
+            if self._is_open(i) and t - self._archive_time[i] >= self._heartbeat_s[i]:
+                self._emit(self._last_time[i], i, self._close(i))
+        return self._readings()
+
+    def flush(self):
+        """ Emit the end of each measure's current segment, e.g. before a reset. Returns the list of readings to queue for upload. """
+        for i in range(len(MEASURES)):
+            if self._is_open(i):
+                self._emit(self._last_time[i], i, self._close(i))
+        return self._readings(True)
@@ -7,6 +7,10 @@
 # https://github.com/mark-gladding/weatherstation
 #
 
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
 import time
 import network
 
@@ -15,48 +19,95 @@ class Connection:
 
      Includes functionality to optionally turn off the WiFi radio on disconnect.
     """    
-    def __init__(self, ssid : str, password : str, perform_complete_poweroff : bool):
+    def __init__(self, ssid : str, password : str, perform_complete_poweroff : bool, https_pool=None):
         """Constructor
 
         Args:
             ssid (str): WiFi SSID to use when connecting
             password (str): WiFi password to use when connecting
             perform_complete_poweroff (bool): If True, disconnect will turn off the WiFi radio and connect will wait additional time for the WiFi radio to turn on.
+            https_pool (HttpsPool, optional): Pool of persistent HTTPS connections to close on disconnect. Defaults to None.
         """        
+        self._https_pool = https_pool
+        self.peers = None       # PeerExchange whose socket is opened once connected and closed on disconnect, set once it is created
         self._wlan = None
         self._ssid = ssid
         self._password = password
         self._perform_complete_poweroff = perform_complete_poweroff
 
-    def connect(self):
-        """ Establish a connection to the local WiFi network.
-            Uses self._ssid and self._password when estblishing the connection.
-            Uses self._perform_complete_poweroff to determine if an additional 3 seconds should be allowed for the WiFi radio to be re-activated.
-            Safe to call multiple times - if the connection is already established, it will return immediately.
-        """     
+    def _start_connecting(self):
+        """ Activate the WiFi radio and start connecting.
+            Returns the number of milliseconds to wait for the radio to be re-activated before polling the connection.
+        """
         if not self._wlan:
             self._wlan = network.WLAN(network.STA_IF)
 
+        activation_delay_ms = 0
         if not self._wlan.active():
             print('activating connection')
             self._wlan.active(True)
             if self._perform_complete_poweroff:
-                time.sleep_ms(3000)     # Allow 3 seconds to re-activate the WiFi radio, etc.
+                activation_delay_ms = 3000      # Allow 3 seconds to re-activate the WiFi radio, etc.
+        return activation_delay_ms
+
+    def _connecting(self, retries):
+        """ Return True while a connection attempt is still in progress. """
+        return not self._wlan.isconnected() and self._wlan.status() >= 0 and retries < 20
+
+    def _connected(self):
+        """ Return True if the connection was established, starting to receive from the peers if it was. """
+        if not self._wlan.isconnected():
+            return False
+        if self.peers:
+            self.peers.open()
+        return True
+
+    def connect(self):
+        """ Establish a connection to the local WiFi network.
+            Uses self._ssid and self._password when estblishing the connection.
+            Uses self._perform_complete_poweroff to determine if an additional 3 seconds should be allowed for the WiFi radio to be re-activated.
+            Safe to call multiple times - if the connection is already established, it will return immediately.
+        """     
+        time.sleep_ms(self._start_connecting())
         if not self._wlan.isconnected():
             print(f'Connecting to "{self._ssid}"')
             self._wlan.connect(self._ssid, self._password)
             retries = 0
-            while not self._wlan.isconnected() and self._wlan.status() >= 0 and retries < 20:
+            while self._connecting(retries):
                 retries += 1
                 print(f"Retry {retries}")
                 time.sleep_ms(500)      
-        return self._wlan.isconnected()
+        return self._connected()
+
+    async def connect_async(self):
+        """ Same as connect(), but allows other tasks to run while waiting for the WiFi radio and the connection.
+        """
+        await asyncio.sleep(self._start_connecting() / 1000)
+        if not self._wlan.isconnected():
+            print(f'Connecting to "{self._ssid}"')
+            self._wlan.connect(self._ssid, self._password)
+            retries = 0
+            while self._connecting(retries):
+                retries += 1
+                print(f"Retry {retries}")
+                await asyncio.sleep(0.5)
+        return self._connected()
+
+    def is_connected(self):
+        """ Return True if currently connected to the local WiFi network. """
+        return self._wlan != None and self._wlan.isconnected()
 
     def disconnect(self):
         """ Disconnect from the local WiFi network.
             Uses self._perform_complete_poweroff to determine if the WiFi radio should be turned off, so the Pico W can be placed in a low power mode.
             Safe to call multiple times - if there is no connection or its already disconnected, this function will do nothing.
+            Any persistent HTTPS connections and the peer socket are closed first, as they cannot survive the WiFi connection being dropped.
         """ 
+        if self._https_pool:
+            self._https_pool.close_all()
+        if self.peers:
+            self.peers.close()
+
         if self._wlan == None:
             return
 
@@ -7,10 +7,12 @@
 # https://github.com/mark-gladding/weatherstation
 #
 
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
 from enhanced_display import Enhanced_Display
 import machine
-from machine import Timer
-import micropython
 import time
 
 class Display:
@@ -20,9 +22,11 @@ class Display:
         self._display_cycle_period_ms = display_cycle_period_ms
         self._led = machine.Pin("LED", machine.Pin.OUT)
         self._display = None
-        self._timer = None
+        self._cycling = False
         self._readings = []
         self._reading_index = 0
+        self._frames = []           # Preallocated frame of each reading, drawn when the readings are updated
+        self._front = None          # Holds the display buffer while the frames are drawn
         self._show_status = True
 
     def init(self):
@@ -87,30 +91,67 @@ class Display:
         return titleText
 
     def cycle_display(self):
-
-        self._display.fill(0)
-
+        """ Show the next reading's frame. The frames are drawn in advance, so this is just a copy and a flush. """
         if len(self._readings) == 0:
+            self._display.fill(0)
             return
         
         self._reading_index = min(self._reading_index, len(self._readings) - 1)
         self.current_readings = self._readings[self._reading_index]
-        temperature = self.current_readings['Temperature']
-        local_time_string = self.current_readings['Time']
-        sensor_location = self.current_readings['Location']
+        self._display.load_frame(self._frames[self._reading_index])
+        self._display.show()
+        self._reading_index = (self._reading_index + 1) % len(self._readings)
+
+    def _draw_frames(self):
+        """ Draw the frame of each reading into its own back buffer, leaving the display buffer unchanged.
+            The content only changes when the readings are updated, so the frames are shown repeatedly without redrawing them.
+        """
+        if self._front == None:
+            self._front = self._display.new_frame()
+        self._display.save_frame(self._front)
+        for i, readings in enumerate(self._readings):
+            if i == len(self._frames):
+                self._frames.append(self._display.new_frame())
+            self._draw_readings(readings)
+            self._display.save_frame(self._frames[i])
+        self._display.load_frame(self._front)
+
+    def _draw_readings(self, readings):
+        temperature = readings['Temperature']
+        local_time_string = readings['Time']
+        sensor_location = readings['Location']
+
+        self._display.fill(0)
 
         self._display.select_font('digits-30')
         degrees = '\u00b0'
-        self._display.text(f'{temperature:.1f}{degrees}', 0, 16, 1)
+        if temperature != None:
+            self._display.text(f'{temperature:.1f}{degrees}', 0, 16, 1)
+
+        # Any other remote measures are shown on one line, below the temperature.
+        details = []
+        if readings.get('Humidity') != None:
+            details.append(f'{readings["Humidity"]:.0f}%RH')
+        if readings.get('Pressure') != None:
+            details.append(f'{readings["Pressure"]:.0f}hPa')
+        if details:
+            self._display.select_font(None)
+            self._display.text(' '.join(details), 0, 47)
 
         self._display.select_font('text-16')
         self._display.text(f'{local_time_string}', 0, 0, 1)
         self._display.text(f'{self._title(sensor_location)}', 0, 0, 1, 2)
 
-        self._display.show()
-        self._reading_index = (self._reading_index + 1) % len(self._readings)
+    def update_readings(self, local_time_string, sensor_location, tempC, remote_locations, remote_readings):
+        """ Update the readings to cycle through.
 
-    def update_readings(self, local_time_string, sensor_location, tempC, remote_location, remote_tempC):
+        Args:
+            local_time_string (str): Time of the readings.
+            sensor_location (str): Name of the location of this sensor.
+            tempC (float): Temperature read by this sensor.
+            remote_locations (list): Names of the remote sensor locations to display, in order.
+            remote_readings (dict): Table of the latest remote readings, {location : {measure : value}}.
+        """
         if not self._display:
             return
         
@@ -121,22 +162,27 @@ class Display:
             'Temperature' : tempC }
         ]
         
-        if remote_location:
+        for remote_location in remote_locations:
+            values = remote_readings.get(remote_location, {})
             self._readings.append(        
                 { 'Time' : local_time_string,
                 'Location' : remote_location,
-                'Temperature' : remote_tempC })
+                'Temperature' : values.get('temperature'),
+                'Humidity' : values.get('humidity'),
+                'Pressure' : values.get('pressure') })
+        self._draw_frames()
             
-            if not self._timer:
-                self._timer = Timer()
-                self._timer.init(mode=Timer.PERIODIC, period=self._display_cycle_period_ms, callback=self._timer_callback)
+        if remote_locations:
+            if not self._cycling:
+                self._cycling = True
                 self.cycle_display()
         else:
             self.cycle_display()
-        
-
-    def _timer_callback(self, calback_arg):
-            micropython.schedule(self._scheduled_cycle_display, calback_arg)
 
-    def _scheduled_cycle_display(self, callback_arg):
-        self.cycle_display()
+    async def run(self):
+        """ Task which cycles the display between the readings every display_cycle_period_ms.
+        """
+        while True:
+            await asyncio.sleep(self._display_cycle_period_ms / 1000)
+            if self._cycling:
+                self.cycle_display()
@@ -0,0 +1,83 @@
+# EndpointCache class
+#
+# Copyright (C) Mark Gladding 2023.
+#
+# MIT License (see the accompanying license file)
+#
+# https://github.com/mark-gladding/weatherstation
+#
+
+import json
+import os
+import time
+
+class EndpointCache:
+    """Class providing a cache of the Timestream endpoints returned by DescribeEndpoints.
+
+     Each endpoint is kept for the CachePeriodInMinutes advertised by the service and the cache is
+     saved to flash, so a reboot doesn't force the endpoints to be discovered again.
+    """
+    def __init__(self, filename='Endpoints.json'):
+        """Constructor
+
+        Args:
+            filename (str, optional): Name of the file used to persist the cache. Defaults to 'Endpoints.json'.
+        """
+        self._filename = filename
+        self._endpoints = None
+
+    def _key(self, mode, region):
+        return f'{mode}:{region}'
+
+    def _load(self):
+        if self._endpoints != None:
+            return
+        self._endpoints = {}
+        try:
+            with open(self._filename) as f:
+                self._endpoints = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        try:
+            if self._endpoints:
+                with open(self._filename, 'w') as f:
+                    json.dump(self._endpoints, f)
+            else:
+                os.remove(self._filename)
+        except OSError:
+            pass
+
+    def get(self, mode, region):
+        """ Return the cached endpoint address for the given mode and region, or None if there is no
+            cached endpoint or it has expired.
+        """
+        self._load()
+        key = self._key(mode, region)
+        endpoint = self._endpoints.get(key)
+        if not endpoint:
+            return None
+        address, expiry_time_s = endpoint
+        if time.time() >= expiry_time_s:
+            del self._endpoints[key]
+            self._save()
+            return None
+        return address
+
+    def put(self, mode, region, address, cache_period_m):
+        """ Cache the endpoint address for the given mode and region for cache_period_m minutes.
+        """
+        self._load()
+        self._endpoints[self._key(mode, region)] = [address, time.time() + cache_period_m * 60]
+        self._save()
+
+    def invalidate(self, mode, region):
+        """ Remove the cached endpoint for the given mode and region (e.g. because the endpoint has failed),
+            forcing it to be discovered again.
+        """
+        self._load()
+        key = self._key(mode, region)
+        if key in self._endpoints:
+            del self._endpoints[key]
+            self._save()
@@ -2,6 +2,7 @@
 #  - Render different sized fonts using the packed_font module.
 #  - Detects if a display is present and performs NOPs if not present (i.e. code will still run without a display connected)
 #  - Take a screenshot of the display and save it to a .bmp file.
+#  - Cache rendered strings, so redrawing the same text is a single blit.
 #
 # Copyright (C) Mark Gladding 2023.
 #
@@ -11,17 +12,33 @@
 #
 
 from PiicoDev_SSD1306 import *
+try:
+    from ucollections import OrderedDict
+except ImportError:
+    from collections import OrderedDict
 import math
 import packed_font
 import struct
 
 class Enhanced_Display:
-    def __init__(self, address=0x3C,bus=None, freq=None, sda=None, scl=None, asw=None):
+    def __init__(self, address=0x3C,bus=None, freq=None, sda=None, scl=None, asw=None, text_cache_bytes=2048):
+        """Constructor
+
+        Args:
+            text_cache_bytes (int, optional): Maximum size in bytes of the bitmaps of rendered strings to keep, so they can be redrawn
+                without rendering them again. The least recently drawn strings are evicted first. 0 = disable. Defaults to 2048.
+        """
         self._display = create_PiicoDev_SSD1306(address, bus, freq, sda, scl, asw)
         self.width = WIDTH
         self.height = HEIGHT
         self.is_present = False
         self.selected_font = None
+        self._text_cache = OrderedDict()        # (font name, text) -> (bitmap, width, height, size), least recently used first
+        self._text_cache_max_bytes = text_cache_bytes
+        self.text_cache_bytes = 0               # Size of the bitmaps in the cache
+        self.text_cache_hits = 0                # Number of strings drawn from the cache
+        self.text_cache_misses = 0              # Number of strings rendered to a bitmap, as they weren't in the cache
+        self.text_cache_evictions = 0           # Number of strings evicted to make room for another
 
         if self._display.comms_err:
             print('Display not detected.')
@@ -56,6 +73,37 @@ class Enhanced_Display:
         if self.is_present:
             packed_font.unload_all_fonts()
             self.selected_font = None
+            self.clear_text_cache()
+
+    def clear_text_cache(self):
+        """ Discard all the rendered strings. """
+        self._text_cache = OrderedDict()
+        self.text_cache_bytes = 0
+
+    def _get_rendered_text(self, text):
+        """ Return the (bitmap, width, height, size) of the text in the selected font, from the cache if possible. """
+        key = (self.selected_font, text)
+        entry = self._text_cache.pop(key, None)
+        if entry:
+            self.text_cache_hits += 1
+            self._text_cache[key] = entry       # Now the most recently used
+            return entry
+
+        packed_font.select_font(self.selected_font)
+        entry = packed_font.render_text(text)
+        if entry[0] == None:        # Can't be rendered to a bitmap (the built in font without framebuf)
+            return entry
+        self.text_cache_misses += 1
+        size = entry[3]
+        if size > self._text_cache_max_bytes:
+            return entry
+        while self.text_cache_bytes + size > self._text_cache_max_bytes:
+            evicted_key = next(iter(self._text_cache))
+            self.text_cache_bytes -= self._text_cache.pop(evicted_key)[3]
+            self.text_cache_evictions += 1
+        self._text_cache[key] = entry
+        self.text_cache_bytes += size
+        return entry
 
     def select_font(self, font_name):
         """Select the font to use for subsequent calls to get_text_size() and text()
@@ -76,6 +124,9 @@ class Enhanced_Display:
         """
 
         if self.is_present:
+            entry = self._text_cache.get((self.selected_font, text))
+            if entry:
+                return entry[1], entry[2]
             packed_font.select_font(self.selected_font)
             return packed_font.get_text_size(text)
         return 0, 0
@@ -93,9 +144,42 @@ class Enhanced_Display:
             max_height (int, optional): Height of the box to align text vertically within. Defaults to display height.
             c (int, optional): Color to render text in. Defaults to 1.
         """    
-        if self.is_present:
+        if not self.is_present or not text:
+            return
+        bitmap = None
+        if self._text_cache_max_bytes > 0:
+            bitmap, width, height, size = self._get_rendered_text(text)
+        if bitmap == None:      # Caching is disabled, or the text can't be rendered to a bitmap, so draw it directly
             packed_font.select_font(self.selected_font)
             packed_font.text(self._display, text, x, y, max_width, horiz_align, max_height, vert_align, c)
+        else:
+            packed_font.draw_bitmap(self._display, bitmap, width, height, x, y, max_width, horiz_align, max_height, vert_align, c)
+
+    def new_frame(self):
+        """Allocate a frame, which can hold the contents of the display buffer.
+
+        Returns:
+            bytearray: A blank frame, the same size as the display buffer.
+        """
+        return bytearray(len(self._display.buffer)) if self.is_present else bytearray(0)
+
+    def save_frame(self, frame):
+        """Copy the display buffer into a frame, so it can be shown again later with load_frame().
+
+        Args:
+            frame (bytearray): Frame allocated by new_frame().
+        """
+        if self.is_present:
+            frame[:] = self._display.buffer
+
+    def load_frame(self, frame):
+        """Copy a frame saved with save_frame() into the display buffer. Call show() to display it.
+
+        Args:
+            frame (bytearray): Frame allocated by new_frame().
+        """
+        if self.is_present:
+            self._display.buffer[:] = frame
 
     def clear(self):
         """Clear the display and show the blank screen.
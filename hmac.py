@@ -13,10 +13,74 @@ trans_36 = bytes((x ^ 0x36) for x in range(256))
 digest_size = None
 
 def _translate(key, table):
-    new_key = bytearray(len(key))
-    for i in range(0, len(key)):
-        new_key[i] = table[key[i]]
-    return new_key
+    try:
+        return bytes(key).translate(table)
+    except AttributeError:
+        # MicroPython bytes don't support translate(), so fall back to translating each byte.
+        new_key = bytearray(len(key))
+        for i in range(0, len(key)):
+            new_key[i] = table[key[i]]
+        return new_key
+
+def _digest_constructor(digest):
+    if callable(digest):
+        return digest
+    elif isinstance(digest, str):
+        return lambda d=b'': _hashlib.new(digest, d)
+    else:
+        return lambda d=b'': digest.new(d)
+
+class HMACKey:
+    """Precomputed HMAC key schedule.
+
+    The key is padded and translated once. If the hash objects support copy(),
+    the inner and outer hash states after the key block are kept as well, so
+    each digest only needs to hash the message.
+    """
+
+    def __init__(self, key, digest):
+        """Create a new HMAC key schedule.
+
+        key: bytes or buffer, The key for the keyed hash object.
+        digest: A hash name suitable for hashlib.new() for best performance. *OR*
+                A hashlib constructor returning a new hash object. *OR*
+                A module supporting PEP 247.
+        """
+        self._digest_cons = _digest_constructor(digest)
+
+        inner = self._digest_cons()
+        blocksize = getattr(inner, 'block_size', 64)
+        if len(key) > blocksize:
+            key = self._digest_cons(key).digest()
+        key = key + b'\x00' * (blocksize - len(key))
+
+        self._ipad = _translate(key, trans_36)
+        self._opad = _translate(key, trans_5C)
+        self._inner = None
+        self._outer = None
+        if hasattr(inner, 'copy'):
+            outer = self._digest_cons()
+            inner.update(self._ipad)
+            outer.update(self._opad)
+            self._inner = inner
+            self._outer = outer
+
+    def digest(self, msg):
+        """Return the HMAC of msg using this key.
+
+        msg: bytes or buffer, Input message.
+        """
+        if self._inner:
+            inner = self._inner.copy()
+            outer = self._outer.copy()
+        else:
+            inner = self._digest_cons()
+            outer = self._digest_cons()
+            inner.update(self._ipad)
+            outer.update(self._opad)
+        inner.update(msg)
+        outer.update(inner.digest())
+        return outer.digest()
 
 def digest(key, msg, digest):
     """Fast inline implementation of HMAC.
@@ -27,23 +91,4 @@ def digest(key, msg, digest):
             A hashlib constructor returning a new hash object. *OR*
             A module supporting PEP 247.
     """
-
-    if callable(digest):
-        digest_cons = digest
-    elif isinstance(digest, str):
-        digest_cons = lambda d=b'': _hashlib.new(digest, d)
-    else:
-        digest_cons = lambda d=b'': digest.new(d)
-
-    inner = digest_cons()
-    outer = digest_cons()
-    blocksize = getattr(inner, 'block_size', 64)
-    if len(key) > blocksize:
-        key = digest_cons(key).digest()
-    key = key + b'\x00' * (blocksize - len(key))
-
-    inner.update(_translate(key,trans_36))
-    outer.update(_translate(key,trans_5C))
-    inner.update(msg)
-    outer.update(inner.digest())
-    return outer.digest()
\ No newline at end of file
+    return HMACKey(key, digest).digest(msg)
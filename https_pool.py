@@ -0,0 +1,259 @@
+# HttpsPool class
+#
+# Copyright (C) Mark Gladding 2023.
+#
+# MIT License (see the accompanying license file)
+#
+# https://github.com/mark-gladding/weatherstation
+#
+
+import errno
+import json
+import socket
+try:
+    import ssl
+except ImportError:
+    import ussl as ssl
+
+_READ_CHUNK = 256           # Size of each read of the response body
+_SCANNED_CONTENT_BYTES = 256    # Bytes of a scanned response body kept as content (e.g. for error messages)
+
+def is_timeout(e):
+    """ Return True if the exception is a socket timeout, after which the request may have been received and processed. """
+    return isinstance(e, OSError) and ((e.args and e.args[0] == errno.ETIMEDOUT) or isinstance(e, getattr(socket, 'timeout', ())))
+
+class _StaleConnection(Exception):
+    """ Raised when a reused connection fails before the server could have received the whole request, so it is safe to resend. """
+
+class Response:
+    """Minimal response object, compatible with the parts of urequests.Response used by this application.
+    """
+    def __init__(self, status_code : int, reason : str, headers : dict, content : bytes):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        """ The body has already been read, so there is nothing to release. Provided for compatibility with urequests. """
+        pass
+
+class HttpsPool:
+    """Class providing a small pool of persistent HTTPS connections, keyed by host.
+
+     Requests are sent using HTTP/1.1 keep-alive so the DNS lookup, TCP connect and TLS handshake
+     are only paid once per host, rather than once per request.
+    """
+    def __init__(self, port=443, timeout_s=10, ssl_context=None, max_response_bytes=8192):
+        """Constructor
+
+        Args:
+            port (int, optional): Default port to connect to, used when the host doesn't specify one. Defaults to 443.
+            timeout_s (int, optional): Socket timeout in seconds. Defaults to 10.
+            ssl_context (SSLContext, optional): Context used to wrap sockets. Defaults to None (use ssl.wrap_socket or the default context).
+            max_response_bytes (int, optional): Maximum number of bytes of a response body to read. A longer body is truncated,
+                and its connection closed. Defaults to 8192.
+        """
+        self._port = port
+        self._timeout_s = timeout_s
+        self._ssl_context = ssl_context
+        self._max_response_bytes = max_response_bytes
+        self._connections = {}
+        self.handshakes = 0             # Number of TLS handshakes performed
+        self.handshakes_avoided = 0     # Number of requests sent on an already open connection
+        self.stale_reconnects = 0       # Number of reused connections which had been closed by the server
+        self.peak_open_sockets = 0      # Maximum number of sockets open at once
+        self.peak_response_bytes = 0    # Size of the largest response body read
+        self.truncated_responses = 0    # Number of response bodies longer than max_response_bytes
+
+    def _wrap_socket(self, sock, host):
+        if self._ssl_context:
+            return self._ssl_context.wrap_socket(sock, server_hostname=host)
+        if hasattr(ssl, 'wrap_socket'):
+            return ssl.wrap_socket(sock, server_hostname=host)
+        return ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+
+    def _open(self, host):
+        hostname, port = host, self._port
+        if ':' in host:
+            hostname, port = host.split(':')
+            port = int(port)
+        addr = socket.getaddrinfo(hostname, port, 0, socket.SOCK_STREAM)[0][-1]
+        sock = socket.socket()
+        try:
+            sock.settimeout(self._timeout_s)
+            sock.connect(addr)
+            sock = self._wrap_socket(sock, hostname)
+        except Exception:
+            sock.close()
+            raise
+        self.handshakes += 1
+        stream = sock.makefile('rwb') if hasattr(sock, 'makefile') else sock
+        connection = (sock, stream)
+        self._connections[host] = connection
+        self.peak_open_sockets = max(self.peak_open_sockets, len(self._connections))
+        return connection
+
+    def open_sockets(self):
+        """ Return the number of sockets currently open. """
+        return len(self._connections)
+
+    def close(self, host):
+        """ Close the connection to the given host (if open). """
+        connection = self._connections.pop(host, None)
+        if connection:
+            sock, stream = connection
+            try:
+                if stream is not sock:
+                    stream.close()
+                sock.close()
+            except Exception:
+                pass
+
+    def close_all(self):
+        """ Close all open connections. Safe to call multiple times. """
+        for host in list(self._connections):
+            self.close(host)
+
+    def post(self, host : str, headers : dict, data="", path='/', scanner=None):
+        """Send a POST request to the given host, reusing an open connection to that host if possible.
+
+        Args:
+            host (str): Host to send the request to, optionally including a port (e.g. 'localhost:8443').
+            headers (dict): Request headers.
+            data (str, bytes or WriteRecordsBody, optional): Request body. A streamed body (one with a length and a write_to method)
+                is serialized directly to the socket. Defaults to "".
+            path (str, optional): Request path. Defaults to '/'.
+            scanner (JsonScanner, optional): If supplied, the response body is fed to the scanner as it is read,
+                and only the start of the body is kept as the response content. Defaults to None.
+
+        Returns:
+            Response: The response, with the body read (up to max_response_bytes).
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        length = data.length if hasattr(data, 'write_to') else len(data)
+        request = [f'POST {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\nContent-Length: {length}\r\n']
+        for name, value in headers.items():
+            request.append(f'{name}: {value}\r\n')
+        request.append('\r\n')
+        request = ''.join(request).encode('utf-8')
+
+        connection = self._connections.get(host)
+        if connection:
+            try:
+                self.handshakes_avoided += 1
+                return self._send(host, connection, request, data, scanner, reused=True)
+            except _StaleConnection:
+                # The server closed the idle connection before receiving the request, so resend on a new connection.
+                # Any other error (e.g. a timeout waiting for the response) is raised, as the request may have been processed.
+                self.handshakes_avoided -= 1
+                self.stale_reconnects += 1
+                self.close(host)
+            except Exception:
+                self.close(host)
+                raise
+        try:
+            return self._send(host, self._open(host), request, data, scanner)
+        except Exception:
+            self.close(host)
+            raise
+
+    def _send(self, host, connection, request, data, scanner, reused=False):
+        """ Send the request and read the response. If reused, a failure while writing the request, or the connection being closed
+            or reset before the first byte of the response, raises _StaleConnection.
+        """
+        sock, stream = connection
+        try:
+            stream.write(request)
+            if hasattr(data, 'write_to'):
+                data.write_to(stream.write)
+            else:
+                stream.write(data)
+            if hasattr(stream, 'flush'):
+                stream.flush()
+        except OSError:
+            if reused:
+                raise _StaleConnection()
+            raise
+
+        try:
+            status_line = stream.readline()
+        except OSError as e:
+            if reused and ((e.args and e.args[0] == errno.ECONNRESET) or isinstance(e, getattr(ssl, 'SSLEOFError', ()))):
+                raise _StaleConnection()
+            raise
+        if not status_line:
+            if reused:
+                raise _StaleConnection()
+            raise EOFError('connection closed')
+        status = status_line.split(None, 2)
+        status_code = int(status[1])
+        reason = status[2].rstrip().decode('utf-8') if len(status) > 2 else ''
+
+        headers = {}
+        while True:
+            line = stream.readline()
+            if not line or line == b'\r\n':
+                break
+            name, value = line.decode('utf-8').split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+        if scanner:
+            scanner.reset()
+        content = bytearray()
+        keep_bytes = _SCANNED_CONTENT_BYTES if scanner else self._max_response_bytes
+        read_bytes = 0
+        truncated = False
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                chunk_size = int(stream.readline().split(b';')[0], 16)
+                if chunk_size == 0:
+                    while stream.readline() not in (b'\r\n', b''):   # Skip trailers
+                        pass
+                    break
+                if read_bytes + chunk_size > self._max_response_bytes:
+                    truncated = True
+                    chunk_size = self._max_response_bytes - read_bytes
+                read_bytes += self._read_body(stream, chunk_size, scanner, content, keep_bytes)
+                if truncated:
+                    break
+                stream.readline()
+        else:
+            length = int(headers.get('content-length', 0))
+            if length > self._max_response_bytes:
+                truncated = True
+                length = self._max_response_bytes
+            read_bytes = self._read_body(stream, length, scanner, content, keep_bytes)
+        if scanner:
+            scanner.finish()
+        self.peak_response_bytes = max(self.peak_response_bytes, read_bytes)
+
+        if truncated:
+            # The rest of the body hasn't been read, so the connection can't be reused.
+            self.truncated_responses += 1
+            self.close(host)
+        elif headers.get('connection', '').lower() == 'close':
+            self.close(host)
+        return Response(status_code, reason, headers, bytes(content))
+
+    def _read_body(self, stream, length, scanner, content, keep_bytes):
+        """ Read length bytes of the body in small chunks, feeding them to the scanner and keeping at most keep_bytes in content. """
+        remaining = length
+        while remaining > 0:
+            data = stream.read(min(remaining, _READ_CHUNK))
+            if not data:
+                raise EOFError('connection closed')
+            remaining -= len(data)
+            if scanner:
+                scanner.feed(data)
+            if len(content) < keep_bytes:
+                content.extend(data[:keep_bytes - len(content)])
+        return length
@@ -0,0 +1,178 @@
+# JsonScanner class
+#
+# Copyright (C) Mark Gladding 2023.
+#
+# MIT License (see the accompanying license file)
+#
+# https://github.com/mark-gladding/weatherstation
+#
+
+_WHITESPACE = b' \t\r\n'
+_LITERAL_END = b' \t\r\n,]}'
+_ESCAPES = { ord('n') : b'\n', ord('t') : b'\t', ord('r') : b'\r', ord('b') : b'\b', ord('f') : b'\f' }
+
+class JsonScanner:
+    """Class extracting a few fields from a JSON document as it is received, without parsing the whole document.
+
+     The document is fed in chunks of any size. Only the values of the requested paths are kept, so memory use
+     doesn't depend on the size of the document. A path is a tuple of object keys and array indexes,
+     e.g. ('Rows', 0, 'Data', 0, 'ScalarValue'). '*' matches any key or index.
+    """
+    def __init__(self, paths, max_value_bytes : int = 256):
+        """Constructor
+
+        Args:
+            paths (list): The paths of the values to extract.
+            max_value_bytes (int, optional): Values longer than this are truncated. Defaults to 256.
+        """
+        self._paths = paths
+        self._max_value_bytes = max_value_bytes
+        self.reset()
+
+    def reset(self):
+        """ Discard any values found, ready to scan a new document. """
+        self.values = {}            # Path -> value of each requested value found
+        self._stack = []            # [key or index] of each open container, with None for objects expecting a key
+        self._objects = []          # True for each open container which is an object
+        self._expect_key = False
+        self._key = None            # Key of the value which follows
+        self._in_string = False
+        self._in_literal = False
+        self._escape = False
+        self._unicode = None
+        self._token = None          # Bytes of the current token, if it is being kept
+        self._is_key = False
+
+    def get(self, path, default=None):
+        """ Return the value found at path, or default if it wasn't found. """
+        return self.values.get(path, default)
+
+    def _is_wanted(self, path):
+        for wanted in self._paths:
+            if len(wanted) == len(path):
+                for a, b in zip(wanted, path):
+                    if a != '*' and a != b:
+                        break
+                else:
+                    return True
+        return False
+
+    def _value_path(self):
+        if self._objects and self._objects[-1]:
+            self._stack[-1] = self._key
+        return tuple(self._stack)
+
+    def _start_value(self):
+        """ Start keeping the value which follows, if its path is wanted. """
+        self._token = bytearray() if self._is_wanted(self._value_path()) else None
+
+    def _append(self, data):
+        if self._token != None and len(self._token) < self._max_value_bytes:
+            self._token.extend(data)
+
+    def _append_byte(self, b):
+        if self._token != None and len(self._token) < self._max_value_bytes:
+            self._token.append(b)
+
+    def _end_value(self, value):
+        if self._token != None:
+            self.values[self._value_path()] = value
+            self._token = None
+
+    def _end_literal(self):
+        self._in_literal = False
+        if self._token == None:
+            return
+        text = bytes(self._token).decode('utf-8')
+        if text == 'true':
+            value = True
+        elif text == 'false':
+            value = False
+        elif text == 'null':
+            value = None
+        else:
+            try:
+                value = int(text)
+            except ValueError:
+                value = float(text)
+        self._end_value(value)
+
+    def _end_string(self):
+        self._in_string = False
+        text = bytes(self._token).decode('utf-8') if self._token != None else None
+        if self._is_key:
+            self._key = text
+            self._is_key = False
+            self._token = None
+        else:
+            self._end_value(text)
+
+    def _string_char(self, b):
+        if self._unicode != None:
+            self._unicode = self._unicode * 16 + int(chr(b), 16)
+            self._escape -= 1
+            if not self._escape:
+                self._append(chr(self._unicode).encode('utf-8'))
+                self._unicode = None
+        elif self._escape:
+            self._escape = False
+            if b == 0x75:   # \uXXXX
+                self._unicode = 0
+                self._escape = 4
+            else:
+                self._append(_ESCAPES.get(b, bytes((b,))))
+        elif b == 0x5C:     # \
+            self._escape = True
+        elif b == 0x22:     # "
+            self._end_string()
+        else:
+            self._append_byte(b)
+
+    def feed(self, data):
+        """ Scan the next chunk of the document. """
+        for b in data:
+            if self._in_string:
+                self._string_char(b)
+                continue
+            if self._in_literal:
+                if b not in _LITERAL_END:
+                    self._append_byte(b)
+                    continue
+                self._end_literal()
+            if b in _WHITESPACE:
+                continue
+            if b == 0x22:       # "
+                self._in_string = True
+                self._is_key = self._expect_key
+                self._expect_key = False
+                if self._is_key:
+                    self._token = bytearray()
+                else:
+                    self._start_value()
+            elif b == 0x7B or b == 0x5B:    # { or [
+                self._value_path()
+                is_object = b == 0x7B
+                self._stack.append(None if is_object else 0)
+                self._objects.append(is_object)
+                self._expect_key = is_object
+            elif b == 0x7D or b == 0x5D:    # } or ]
+                self._expect_key = False
+                if self._stack:
+                    self._stack.pop()
+                    self._objects.pop()
+            elif b == 0x3A:     # :
+                pass
+            elif b == 0x2C:     # ,
+                if self._objects and self._objects[-1]:
+                    self._expect_key = True
+                elif self._stack:
+                    self._stack[-1] += 1
+            else:
+                self._in_literal = True
+                self._start_value()
+                self._append_byte(b)
+
+    def finish(self):
+        """ Complete a document which ends with a literal (e.g. a bare number). """
+        if self._in_literal:
+            self._end_literal()
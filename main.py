@@ -7,81 +7,168 @@
 # https://github.com/mark-gladding/weatherstation
 #
 
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+from aggregator import Aggregator, VALUES_PER_READING
+from compressor import Compressor
 from connection import Connection
 from display import Display
+from https_pool import HttpsPool
 from log import Log
 from power import Power
+from network_worker import NetworkWorker, StatusRelay
 from ntptime import NtpTime
+from peer_exchange import PeerExchange
 import machine
 from sensor import AtmosphericSensor
 import secrets
 import settings
 from startup import Startup
+from station import Station
 from timestream import Timestream
+from upload_queue import UploadQueue
 
 if __name__ == "__main__":
+    # Anything the error handler uses is defined first, so it can always reach the reset.
+    log = reducer = upload_queue = display = connection = network_worker = None
     try:
         log = Log()
+        aggregating = settings.aggregate_day_bucket_s > 0 or settings.aggregate_night_bucket_s > 0
+        # Aggregated readings have more values, so are kept in a separate queue.
+        upload_queue = UploadQueue(filename='AggregateQueue.bin' if aggregating else 'UploadQueue.bin',
+                                   max_readings=settings.upload_queue_max_readings, 
+                                   sync_period=settings.upload_queue_sync_period,
+                                   values_per_reading=VALUES_PER_READING if aggregating else 3)
+        reducer = None
+        if settings.compression_tolerances:
+            reducer = Compressor(tolerances=settings.compression_tolerances, 
+                                 heartbeat_s=settings.compression_heartbeat_s)
         display = Display(display_cycle_period_ms=settings.display_cycle_period_ms)
+        https_pool = HttpsPool()
         connection = Connection(ssid=secrets.wifi_ssid, 
                                 password=secrets.wifi_password, 
-                                perform_complete_poweroff=settings.deep_sleep)
+                                perform_complete_poweroff=settings.deep_sleep,
+                                https_pool=https_pool)
         power = Power(display=display, 
                       connection=connection, 
                       sensor_read_period_s=settings.sensor_read_period_s, 
                       draw_power_period_s=settings.draw_power_period_s)
-        sensor = AtmosphericSensor()
+        sensor = AtmosphericSensor(measure_settings=settings.measures)
         ntptime = NtpTime(ntp_time_server=settings.ntp_time_server, 
                           timezone_api_key=secrets.timezone_api_key, 
                           sync_time_period_m=settings.sync_time_period_m, 
                           timezone_location=settings.timezone_location,
                           day_mode_start_hour=settings.day_mode_start_hour,
                           night_mode_start_hour=settings.night_mode_start_hour)
-        timestream = Timestream(display=display, 
+        if aggregating:
+            reducer = Aggregator(ntptime=ntptime,
+                                 day_bucket_s=settings.aggregate_day_bucket_s,
+                                 night_bucket_s=settings.aggregate_night_bucket_s)
+        # When the network runs on the second core, its status messages are relayed to the display on this core.
+        status_relay = StatusRelay() if settings.network_on_second_core else None
+        timestream = Timestream(display=status_relay or display, 
+                                https_pool=https_pool,
                                 aws_access_key=secrets.aws_access_key, 
                                 aws_secret_access_key=secrets.aws_secret_access_key, 
                                 aws_region=settings.aws_region,
                                 database_name=settings.database_name, 
                                 sensor_readings_table=settings.sensor_readings_table,
                                 sensor_location=settings.sensor_location, 
-                                remote_sensor_location=settings.remote_sensor_location, 
-                                device_log_table=settings.device_log_table)
+                                remote_sensor_locations=settings.remote_sensor_locations, 
+                                device_log_table=settings.device_log_table,
+                                multi_measure_records=settings.multi_measure_records,
+                                remote_measures=settings.remote_measures,
+                                remote_multi_measure_records=settings.remote_multi_measure_records)
+        peers = None
+        if settings.peer_exchange:
+            peers = PeerExchange(connection=connection,
+                                 sensor_location=settings.sensor_location,
+                                 remote_sensor_locations=settings.remote_sensor_locations,
+                                 group=settings.peer_group,
+                                 port=settings.peer_port,
+                                 max_age_s=settings.peer_max_age_s,
+                                 repeats=settings.peer_repeats,
+                                 repeat_interval_ms=settings.peer_repeat_interval_ms)
+            connection.peers = peers
         startup = Startup(display=display, 
                           connection=connection, 
                           ntptime=ntptime, 
                           timestream=timestream, 
                           log=log)
 
+        network_worker = None
+        if settings.network_on_second_core:
+            network_worker = NetworkWorker(connection=connection,
+                                           ntptime=ntptime,
+                                           timestream=timestream,
+                                           upload_queue=upload_queue,
+                                           remote_sensor_locations=settings.remote_sensor_locations,
+                                           day_upload_period=settings.day_upload_period,
+                                           night_upload_period=settings.night_upload_period,
+                                           peers=peers)
+        station = Station(display=display,
+                          connection=connection,
+                          power=power,
+                          sensor=sensor,
+                          ntptime=ntptime,
+                          timestream=timestream,
+                          upload_queue=upload_queue,
+                          sensor_location=settings.sensor_location,
+                          remote_sensor_locations=settings.remote_sensor_locations,
+                          sensor_read_period_s=settings.sensor_read_period_s,
+                          draw_power_period_s=settings.draw_power_period_s,
+                          day_upload_period=settings.day_upload_period,
+                          night_upload_period=settings.night_upload_period,
+                          deep_sleep=settings.deep_sleep,
+                          network_guard_s=settings.network_guard_s,
+                          reducer=reducer,
+                          network_worker=network_worker,
+                          status_relay=status_relay,
+                          peers=None if network_worker else peers)
+
         startup.startup()
+        power.select_sensor_mode(sensor, settings.deep_sleep)
 
-        remote_tempC = 0
         current_time, tempC, pres_hPa, humRH = sensor.read_sensor()
-        display.update_readings(ntptime.get_local_time_string(current_time), settings.sensor_location, tempC, None, 0)
-        remote_tempC = timestream.read_remote_sensor(remote_tempC)
-        display.update_readings(ntptime.get_local_time_string(current_time), settings.sensor_location, tempC, settings.remote_sensor_location, remote_tempC)
-        power.wait_until_next_reading(False)
-
-        readings_to_upload = []
-        upload_countdown = settings.day_upload_period if ntptime.is_day() else settings.night_upload_period
+        display.update_readings(ntptime.get_local_time_string(current_time), settings.sensor_location, tempC, [], {})
+        station.remote_readings = timestream.read_remote_sensors(station.remote_readings)
+        display.update_readings(ntptime.get_local_time_string(current_time), settings.sensor_location, tempC, settings.remote_sensor_locations, station.remote_readings)
 
-        while(True):
-            current_time, tempC, pres_hPa, humRH = sensor.read_sensor()
-            display.update_readings(ntptime.get_local_time_string(current_time), settings.sensor_location, tempC, settings.remote_sensor_location, remote_tempC)
-            readings = timestream.format_readings(current_time, tempC, pres_hPa, humRH)
-            readings_to_upload.extend(readings)
-            upload_countdown -= 1
-            if upload_countdown <= 0 and connection.connect():
-                ntptime.sync_time()
-                timestream.upload_readings(readings_to_upload)
-                remote_tempC = timestream.read_remote_sensor(remote_tempC)
-                upload_countdown = settings.day_upload_period if ntptime.is_day() else settings.night_upload_period
-            power.wait_until_next_reading(settings.deep_sleep or not ntptime.is_day())
+        asyncio.run(station.run())
 
     except Exception as e:
-        log.write_last_error(e)
-        display.show_status()
-        display.error(str(e))
-        connection.disconnect()
+        if log:
+            try:
+                log.write_last_error(e)
+            except Exception:
+                pass
+        # With a network worker, only the second core accesses the upload queue, so it must stop first.
+        if upload_queue and (not network_worker or network_worker.stop()):
+            try:
+                if network_worker:
+                    reading = network_worker.readings.get()
+                    while reading != None:
+                        upload_queue.append(*reading)
+                        reading = network_worker.readings.get()
+                if reducer:
+                    for reading in reducer.flush():
+                        upload_queue.append(*reading)
+                upload_queue.sync()     # Keep any buffered readings across the reset
+            except Exception:
+                pass                    # e.g. the flash is full, which mustn't stop the reset
+        if display:
+            try:
+                display.show_status()
+                display.error(str(e))
+            except Exception:
+                pass
+        if connection:
+            try:
+                connection.disconnect()
+            except Exception:
+                pass
         if settings.reboot_on_error:
             machine.reset()
         else:
@@ -0,0 +1,139 @@
+# NetworkWorker class
+#
+# Copyright (C) Mark Gladding 2023.
+#
+# MIT License (see the accompanying license file)
+#
+# https://github.com/mark-gladding/weatherstation
+#
+
+import _thread
+from reading_buffer import ReadingBuffer
+from ring_buffer import RingBuffer
+import time
+
+def _time_ms():
+    return time.time_ns() // 1000000
+
+class StatusRelay:
+    """Class which stands in for the Display on the second core.
+
+     Status and error messages are passed back to the first core, which owns the display.
+    """
+    def __init__(self):
+        self.messages = RingBuffer(8)
+
+    def status(self, text, flashcount=1):
+        self.messages.put((text, flashcount))
+
+    def error(self, text):
+        self.status(text, 2)
+
+class NetworkWorker:
+    """Class running the Timestream upload, remote sensor read and time sync pipeline on the second core of the RP2040.
+
+     The first core keeps sampling the sensor and driving the display. Readings are passed to this worker,
+     and remote sensor readings are passed back, through lock protected ring buffers.
+    """
+    def __init__(self, connection, ntptime, timestream, upload_queue, remote_sensor_locations : list,
+                 day_upload_period : int, night_upload_period : int, peers=None):
+        """Constructor
+
+        Args:
+            connection (Connection): The connection being used.
+            ntptime (NtpTime): Used to resynchronise the RTC.
+            timestream (Timestream): Used to upload readings and read the remote sensor. Should be created with a StatusRelay as its display.
+            upload_queue (UploadQueue): Queue of readings waiting to be uploaded. Only accessed from the second core.
+            remote_sensor_locations (list): Names of the remote sensors to read (may be empty).
+            day_upload_period (int): Number of readings between uploads during the day.
+            night_upload_period (int): Number of readings between uploads during the night.
+            peers (PeerExchange, optional): If supplied, the latest reading is multicast to the other stations on the LAN after each upload,
+                and fresh readings received from them are passed on in preference to those read from Timestream. Defaults to None.
+        """
+        self._connection = connection
+        self._ntptime = ntptime
+        self._timestream = timestream
+        self._upload_queue = upload_queue
+        self._remote_sensor_locations = remote_sensor_locations
+        self._day_upload_period = day_upload_period
+        self._night_upload_period = night_upload_period
+        self._peers = peers
+        self._next_upload_sample = 0
+        self._remote_readings = {}
+
+        self.readings = ReadingBuffer(32, upload_queue.values_per_reading)    # Readings from the first core, waiting to be queued for upload
+        self.samples = 0                        # Number of samples taken by the first core
+        self.latest_reading = None              # Latest reading taken by the first core, multicast to the peers after each upload
+        self.remote_readings = RingBuffer(4)    # Tables of remote sensor readings for the first core to display
+        self.network_lock = _thread.allocate_lock()     # Held while the connection is in use
+        self.exception = None                   # Exception which stopped the worker, to be raised on the first core
+        self.busy_ms = 0                        # Time spent working on the second core
+        self._stopping = False
+        self._running = False
+
+    def _get_upload_period(self):
+        return self._day_upload_period if self._ntptime.is_day() else self._night_upload_period
+
+    def _merged_remote_readings(self):
+        return self._peers.merge(self._remote_readings) if self._peers else self._remote_readings
+
+    def start(self):
+        """ Start the worker on the second core. """
+        self._next_upload_sample = self._get_upload_period()
+        self._running = True
+        _thread.start_new_thread(self._run, ())
+
+    def stop(self, timeout_ms=15000):
+        """ Ask the worker to stop, waiting for it to finish any upload in progress.
+            Returns True once the second core no longer accesses the upload queue, so the first core can write to it, e.g. before a reset.
+        """
+        self._stopping = True
+        deadline = _time_ms() + timeout_ms
+        while self._running and _time_ms() < deadline:
+            time.sleep(0.05)
+        return not self._running
+
+    def _run(self):
+        try:
+            while not self._stopping:
+                reading = self.readings.get()
+                if reading != None:
+                    start_ms = _time_ms()
+                    self._upload_queue.append(*reading)
+                    self.busy_ms += _time_ms() - start_ms
+                    continue
+                if self.samples < self._next_upload_sample or self._upload_queue.count() == 0:
+                    # The first core may be disconnecting (closing the peer socket) for a power draw, so only receive while it isn't.
+                    if self._peers and self.network_lock.acquire(0):
+                        try:
+                            if self._peers.receive():
+                                self.remote_readings.put(self._merged_remote_readings())
+                        finally:
+                            self.network_lock.release()
+                    time.sleep(0.05)
+                    continue
+                start_ms = _time_ms()
+                self._upload()
+                self.busy_ms += _time_ms() - start_ms
+        except Exception as e:
+            self.exception = e
+        finally:
+            self._running = False
+
+    def _upload(self):
+        self._next_upload_sample = self.samples + 1     # Retry on the next sample if the upload fails
+        self.network_lock.acquire()
+        try:
+            if self._connection.connect():
+                self._ntptime.sync_time()
+                self._timestream.upload_queued_readings(self._upload_queue)
+                if self._peers and self.latest_reading:
+                    self._peers.send(*self.latest_reading)
+                # Remote sensors with fresh readings from the LAN don't need to be read from Timestream.
+                locations = self._peers.stale_locations() if self._peers else self._remote_sensor_locations
+                if locations:
+                    self._remote_readings = self._timestream.read_remote_sensors(self._remote_readings, locations)
+                    self.remote_readings.put(self._merged_remote_readings())
+                self._next_upload_sample = self.samples + self._get_upload_period()
+        finally:
+            self.network_lock.release()
@@ -7,13 +7,16 @@
 # https://github.com/mark-gladding/weatherstation
 #
 
-import json
+from json_scanner import JsonScanner
 import machine
 import socket
 import struct
 import time
 import urequests
 
+_TIMEZONE_FIELDS = [('status',), ('rawOffset',), ('dstOffset',), ('timeZoneName',), ('timeZoneId',)]
+_MAX_RESPONSE_BYTES = 4096      # Maximum number of bytes of the timezone response to read
+
 class NtpTime:
     """Class providing functions to synchronise to UTC time using an NTP server.
 
@@ -30,6 +33,7 @@ class NtpTime:
         self._night_mode_start_hour = night_mode_start_hour
         self._timezone_offset = 0
         self._last_sync_time_s = 0
+        self.peak_response_bytes = 0    # Size of the largest timezone response read
 
     def set_rtc_from_ntp_time(self):
         tm = self._request_ntp_time()
@@ -41,25 +45,38 @@ class NtpTime:
         self._last_sync_time_s = time.time()
         return True        
 
+    def is_sync_due(self):
+        return time.time() >= self._last_sync_time_s + self._sync_time_period_m * 60
+
     def sync_time(self):
-        if time.time() >= self._last_sync_time_s + self._sync_time_period_m * 60:
+        if self.is_sync_due():
             self.set_rtc_from_ntp_time()
 
     def _get_timezone_offset(self):
         response = urequests.get(f'https://maps.googleapis.com/maps/api/timezone/json?location={self._timezone_location}&timestamp={time.time()}&key={self._timezone_api_key}')
+        scanner = JsonScanner(_TIMEZONE_FIELDS)
         try:
-            jresponse = json.loads(response.text)
-            isOk = jresponse["status"] == 'OK'
-            if isOk:
-                offset_in_seconds = jresponse['rawOffset'] + jresponse['dstOffset']
-                hours = (int)(offset_in_seconds / 3600)
-                minutes = (int)((offset_in_seconds - hours * 3600) / 60)
-                seconds = (int)(offset_in_seconds % 60)
-                print(f'Retrieved timezone information {jresponse["timeZoneName"]} for {jresponse["timeZoneId"]}, offset = {hours:02d}:{minutes:02d}:{seconds:02d}.')
-                return offset_in_seconds
+            # Scan the response as it is read, rather than reading it in full and parsing it.
+            read_bytes = 0
+            while read_bytes < _MAX_RESPONSE_BYTES:
+                data = response.raw.read(min(256, _MAX_RESPONSE_BYTES - read_bytes))
+                if not data:
+                    break
+                scanner.feed(data)
+                read_bytes += len(data)
+            scanner.finish()
+            self.peak_response_bytes = max(self.peak_response_bytes, read_bytes)
+        finally:
+            response.close()
 
-        except AttributeError:
-            pass    
+        isOk = scanner.get(('status',)) == 'OK'
+        if isOk:
+            offset_in_seconds = scanner.get(('rawOffset',), 0) + scanner.get(('dstOffset',), 0)
+            hours = (int)(offset_in_seconds / 3600)
+            minutes = (int)((offset_in_seconds - hours * 3600) / 60)
+            seconds = (int)(offset_in_seconds % 60)
+            print(f'Retrieved timezone information {scanner.get(("timeZoneName",))} for {scanner.get(("timeZoneId",))}, offset = {hours:02d}:{minutes:02d}:{seconds:02d}.')
+            return offset_in_seconds
         return 0
 
     def _request_ntp_time(self):
@@ -9,8 +9,14 @@
 # MIT License (see the accompanying license file)
 #
 
+try:
+    import framebuf
+except ImportError:
+    framebuf = None     # Linux / micro:bit, where the display provides its own framebuf shim
+
 _loaded_fonts = {}
 _current_font = None
+_inverse_palette = None     # Maps set glyph pixels to colour 0, to render text in colour 0
 
 def load_font(font_name):
     """Load a packed font into memory for use. Once loaded, the font must be selected for use.
@@ -59,9 +65,63 @@ def _load_packed_font(font_name):
                 'char_height' : char_height,
                 'start_index' : start_index
             }
-        font['data'] = f.read()
+        font['data'] = bytearray(f.read())      # Writable, so glyphs can be framebuffers over the data without copying it
+        _prepare_glyphs(font)
         return font
 
+def _prepare_glyphs(font):
+    """ Convert each character into a form which can be drawn without visiting every pixel.
+        Each row of a character is stored as whole bytes, most significant bit first, which is the MONO_HLSB framebuffer format.
+        So with framebuf, each character becomes a framebuffer over its data, drawn with a single blit.
+        Without framebuf, each character becomes a list of column masks (bit i set if the pixel in row i is set),
+        which are ORed into the display's MONO_VLSB buffer a page at a time.
+    """
+    data = font['data']
+    for char_definition in font['characters'].values():
+        start_index = char_definition['start_index']
+        width = char_definition['char_width']
+        height = char_definition['char_height']
+        width_in_bytes = (width + 7) // 8
+        if framebuf:
+            glyph_data = memoryview(data)[start_index:start_index + width_in_bytes * height]
+            char_definition['glyph'] = framebuf.FrameBuffer(glyph_data, width, height, framebuf.MONO_HLSB)
+        else:
+            columns = [0] * width
+            for i in range(height):
+                row_index = start_index + i * width_in_bytes
+                for j in range(width):
+                    if (data[row_index + (j >> 3)] >> (7 - (j & 7))) & 1:
+                        columns[j] |= 1 << i
+            char_definition['columns'] = columns
+
+def _get_inverse_palette():
+    global _inverse_palette
+    if not _inverse_palette:
+        _inverse_palette = framebuf.FrameBuffer(bytearray(1), 2, 1, framebuf.MONO_HLSB)
+        _inverse_palette.pixel(0, 0, 1)
+        _inverse_palette.pixel(1, 0, 0)
+    return _inverse_palette
+
+def _draw_columns(display, columns, x, y, c):
+    """ Draw a character's column masks into the display's MONO_VLSB buffer (8 vertical pixels per byte, one page per row of bytes). """
+    buffer = display.buffer
+    width = display.width
+    size = len(buffer)
+    for column in columns:
+        if 0 <= x < width:
+            bits = column << y if y >= 0 else column >> -y
+            index = x
+            while bits and index < size:
+                page_bits = bits & 0xFF
+                if page_bits:
+                    if c:
+                        buffer[index] |= page_bits
+                    else:
+                        buffer[index] &= ~page_bits
+                bits >>= 8
+                index += width
+        x += 1
+
 def unload_all_fonts():
     """ Unload all fonts and select the built in font as the current font."""
     global _loaded_fonts,  _current_font
@@ -114,6 +174,79 @@ def get_text_size(text):
         height = max(height, char_definition['char_height'])
     return width, height
 
+def _align(x, y, width, height, max_width, horiz_align, max_height, vert_align):
+    if horiz_align == 1:     # Center
+        x += int((max_width - width) / 2)
+    elif horiz_align == 2:   # Right
+        x += max_width - width
+    if vert_align == 1:      # Center
+        y += int((max_height - height) / 2)
+    elif vert_align == 2:    # Bottom
+        y += max_height - height
+    return x, y
+
+def render_text(text):
+    """Render a text string in the currently selected font into a bitmap, which can be drawn repeatedly with draw_bitmap().
+
+    Args:
+        text (string): Text to render
+
+    Returns:
+        (object, int, int, int): Tuple containing the bitmap, its width and height, and its size in bytes
+            (the size of the equivalent 1 bit per pixel bitmap, when framebuf isn't available).
+    """
+    width, height = get_text_size(text)
+    size = (width + 7) // 8 * height
+    if framebuf:
+        bitmap = framebuf.FrameBuffer(bytearray(size), width, height, framebuf.MONO_HLSB)
+        if _current_font:
+            x = 0
+            characters = _current_font['characters']
+            default_character = _current_font['default_character']
+            for char in text:
+                char_definition = characters.get(char) or characters[default_character]
+                bitmap.blit(char_definition['glyph'], x, 0)
+                x += char_definition['char_width']
+        else:
+            bitmap.text(text, 0, 0, 1)
+        return bitmap, width, height, size
+
+    if not _current_font:
+        return None, width, height, 0   # The built in font can only be drawn directly
+    bitmap = []
+    characters = _current_font['characters']
+    default_character = _current_font['default_character']
+    for char in text:
+        char_definition = characters.get(char) or characters[default_character]
+        bitmap.extend(char_definition['columns'])
+    return bitmap, width, height, size
+
+def draw_bitmap(display, bitmap, width, height, x, y, max_width=0, horiz_align=0, max_height=0, vert_align=0, c=1):
+    """Draw a bitmap created by render_text() on the display, with optional alignment. Only the set pixels are drawn.
+
+    Args:
+        display (PiicoDev_SSD): The display to draw the bitmap on
+        bitmap (object): Bitmap returned by render_text()
+        width (int): Width of the bitmap, returned by render_text()
+        height (int): Height of the bitmap, returned by render_text()
+        x (int): X coordinate to begin drawing
+        y (int): Y coordinate to begin drawing
+        max_width (int, optional): Width of the box to align the bitmap horizontally within. Defaults to 0.
+        horiz_align (int, optional): 0 = Left, 1 = Center, 2 = Right. Defaults to 0.
+        max_height (int, optional): Height of the box to align the bitmap vertically within. Defaults to 0.
+        vert_align (int, optional): 0 = Top, 1 = Center, 2 = Bottom. Defaults to 0.
+        c (int, optional): Color to draw the set pixels in. Defaults to 1.
+    """
+    if (max_width > 0 and horiz_align > 0) or (max_height > 0 and vert_align > 0):
+        x, y = _align(x, y, width, height, max_width, horiz_align, max_height, vert_align)
+    if framebuf:
+        if c:
+            display.blit(bitmap, x, y, 0)
+        else:
+            display.blit(bitmap, x, y, 1, _get_inverse_palette())
+    else:
+        _draw_columns(display, bitmap, x, y, c)
+
 def text(display, text, x, y, max_width=0, horiz_align=0, max_height=0, vert_align=0, c=1):
     """Render a text string to the display in the currently selected font, with optional alignment.
 
@@ -131,14 +264,7 @@ def text(display, text, x, y, max_width=0, horiz_align=0, max_height=0, vert_ali
     
     if (max_width > 0 and horiz_align > 0) or (max_height > 0 and vert_align > 0):
         total_text_width, text_height = get_text_size(text)
-        if horiz_align == 1:     # Center
-            x += int((max_width - total_text_width) / 2)
-        elif horiz_align == 2:   # Right
-            x += max_width - total_text_width
-        if vert_align == 1:      # Center
-            y += int((max_height - text_height) / 2)
-        elif vert_align == 2:    # Bottom
-            y += max_height - text_height
+        x, y = _align(x, y, total_text_width, text_height, max_width, horiz_align, max_height, vert_align)
 
     if not _current_font:   # Built in font
         display.text(text, x, y, c)
@@ -146,21 +272,19 @@ def text(display, text, x, y, max_width=0, horiz_align=0, max_height=0, vert_ali
     
     characters = _current_font['characters']
     default_character = _current_font['default_character']
-    data = _current_font['data']
+    blit = display.blit if framebuf else None
+    palette = _get_inverse_palette() if blit and not c else None
     for char in text:
         try:
             char_definition = characters[char]
         except KeyError:
             char_definition = characters[default_character]
-        start_index = char_definition['start_index']
-        width = char_definition['char_width']
-        height = char_definition['char_height']
-        width_in_bytes = int((width + 7) / 8)
-        for i in range(height):
-            for j in range(width):
-                byte_index = int(j / 8)
-                bit_index = j - byte_index * 8
-                val = data[start_index + i * width_in_bytes + byte_index ]
-                if (val >> (7-bit_index)) & 1:
-                    display.pixel(x + j, y + i, c)
-        x += width
+        if blit:
+            # Only draw the set pixels, in colour c (unset pixels are transparent).
+            if palette:
+                blit(char_definition['glyph'], x, y, 1, palette)
+            else:
+                blit(char_definition['glyph'], x, y, 0)
+        else:
+            _draw_columns(display, char_definition['columns'], x, y, c)
+        x += char_definition['char_width']
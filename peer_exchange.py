@@ -0,0 +1,213 @@
+# PeerExchange class
+#
+# Copyright (C) Mark Gladding 2023.
+#
+# MIT License (see the accompanying license file)
+#
+# https://github.com/mark-gladding/weatherstation
+#
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+import errno
+from sensor import MEASURES
+import socket
+import struct
+import time
+
+_MAGIC = b'WS'
+_VERSION = 1
+_HEADER_FORMAT = '<2sBB'                        # magic, version, length of the location name (which follows)
+_READING_FORMAT = '<I' + 'f' * len(MEASURES)    # time (seconds), tempC, pres_hPa, humRH (NaN if not sampled)
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+_READING_SIZE = struct.calcsize(_READING_FORMAT)
+_MAX_DATAGRAM = 128
+
+class PeerExchange:
+    """Class exchanging the latest readings directly with the other stations on the local network, using UDP multicast.
+
+     Each station multicasts a compact binary datagram (about 30 bytes) holding its location, the time of the reading
+     and its values whenever it uploads. Readings received from the remote stations are used in preference to those
+     read from Timestream while they are fresh, so the remote readings are shown sooner, without a Timestream query,
+     and still shown when the internet is down.
+     The stations only connect briefly to upload, so each reading is sent several times while connected, and the Connection
+     opens the socket as soon as it connects and reads any datagrams received before it disconnects.
+    """
+    def __init__(self, connection, sensor_location : str, remote_sensor_locations : list, group : str, port : int, max_age_s : int,
+                 repeats : int = 3, repeat_interval_ms : int = 500):
+        """Constructor
+
+        Args:
+            connection (Connection): The connection being used. Datagrams are only sent and received while it is connected.
+            sensor_location (str): Name of the location of this sensor, sent with each reading.
+            remote_sensor_locations (list): Names of the remote sensors to receive readings from (may be empty).
+            group (str): Multicast group address, e.g. '239.255.77.77'.
+            port (int): UDP port.
+            max_age_s (int): Readings received more than this many seconds ago are no longer used.
+            repeats (int, optional): Number of times each reading is sent. Defaults to 3.
+            repeat_interval_ms (int, optional): Time in milliseconds between each time a reading is sent. Defaults to 500.
+        """
+        self._connection = connection
+        self._remote_sensor_locations = remote_sensor_locations
+        self._group = group
+        self._port = port
+        self._max_age_s = max_age_s
+        self._repeats = repeats
+        self._repeat_interval_ms = repeat_interval_ms
+        self._socket = None
+        self._unseen = False        # True if readings have been received since receive() last returned
+        self._times = {}            # Location -> time (seconds) of the latest reading received
+        self._readings = {}         # Location -> {measure : value} of the latest value of each measure received
+
+        location = sensor_location.encode('utf-8')
+        self._datagram = bytearray(_HEADER_SIZE + len(location) + _READING_SIZE)
+        struct.pack_into(_HEADER_FORMAT, self._datagram, 0, _MAGIC, _VERSION, len(location))
+        self._datagram[_HEADER_SIZE:_HEADER_SIZE + len(location)] = location
+        self._reading_offset = _HEADER_SIZE + len(location)
+
+        self.sent = 0               # Number of readings sent
+        self.received = 0           # Number of readings received from the remote sensors
+
+    def _get_socket(self):
+        if self._socket:
+            return self._socket
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            if self._remote_sensor_locations:
+                # Only listen for the group's datagrams if there are remote sensors to receive readings from.
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                s.bind(('0.0.0.0', self._port))
+                membership = bytes([int(part) for part in self._group.split('.')]) + bytes(4)    # group, any interface
+                s.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            s.setblocking(False)
+        except OSError:
+            s.close()
+            raise
+        self._socket = s
+        return s
+
+    def _close_socket(self):
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+    def open(self):
+        """ Open the socket, so datagrams are received for as long as the station is connected. Called by the Connection once connected. """
+        try:
+            self._get_socket()
+        except OSError as e:
+            print(f'Failed to open the peer socket: {str(e)}')
+
+    def close(self):
+        """ Close the socket, keeping any readings it has already received. It is reopened when next needed.
+            Called by the Connection before it disconnects, as the group membership doesn't survive the WiFi interface going down.
+        """
+        if self._socket and self._remote_sensor_locations and self._connection.is_connected():
+            self._read()
+        self._close_socket()
+
+    def _send_once(self):
+        """ Multicast the datagram. Returns False if not connected. """
+        if not self._connection.is_connected():
+            return False
+        for attempt in range(2):    # The socket may not have survived the connection being dropped, so reopen it once
+            try:
+                self._get_socket().sendto(self._datagram, (self._group, self._port))
+                self.sent += 1
+                return True
+            except OSError as e:
+                self._close_socket()
+                error = e
+        print(f'Failed to send reading to peers: {str(error)}')
+        return True
+
+    def send(self, current_time, *values):
+        """ Multicast a reading, (current_time, tempC, pres_hPa, humRH), to the other stations, repeats times while connected.
+            Blocks between repeats. Does nothing if not connected.
+        """
+        struct.pack_into(_READING_FORMAT, self._datagram, self._reading_offset, int(current_time), *values)
+        for repeat in range(self._repeats):
+            if repeat:
+                time.sleep(self._repeat_interval_ms / 1000)
+            if not self._send_once():
+                return
+
+    async def send_async(self, current_time, *values):
+        """ Same as send(), but allows other tasks to run between repeats.
+        """
+        struct.pack_into(_READING_FORMAT, self._datagram, self._reading_offset, int(current_time), *values)
+        for repeat in range(self._repeats):
+            if repeat:
+                await asyncio.sleep(self._repeat_interval_ms / 1000)
+            if not self._send_once():
+                return
+
+    def receive(self):
+        """ Read any readings received from the remote stations, without blocking.
+            Returns True if any were received since it was last called, including any kept when the socket was closed.
+        """
+        if self._remote_sensor_locations and self._connection.is_connected():
+            self._read()
+        received = self._unseen
+        self._unseen = False
+        return received
+
+    def _read(self):
+        try:
+            s = self._get_socket()
+            while True:
+                try:
+                    data = s.recv(_MAX_DATAGRAM)
+                except OSError as e:
+                    if e.args[0] == errno.EAGAIN:   # Nothing more to read
+                        break
+                    raise
+                if self._decode(data):
+                    self._unseen = True
+        except OSError as e:
+            print(f'Failed to receive readings from peers: {str(e)}')
+            self._close_socket()
+
+    def _decode(self, data):
+        """ Keep the reading in a datagram if it is from a remote sensor and is newer than the last one received. """
+        if len(data) < _HEADER_SIZE:
+            return False
+        magic, version, location_length = struct.unpack_from(_HEADER_FORMAT, data)
+        if magic != _MAGIC or version != _VERSION or len(data) != _HEADER_SIZE + location_length + _READING_SIZE:
+            return False
+        location = data[_HEADER_SIZE:_HEADER_SIZE + location_length].decode('utf-8')
+        if location not in self._remote_sensor_locations:
+            return False
+        reading = struct.unpack_from(_READING_FORMAT, data, _HEADER_SIZE + location_length)
+        if reading[0] <= self._times.get(location, 0):
+            return False        # A repeat, or delivered out of order
+        self._times[location] = reading[0]
+        values = self._readings.setdefault(location, {})
+        for measure, value in zip(MEASURES, reading[1:]):
+            if value == value:  # Keep the last value of a measure which wasn't sampled (NaN)
+                values[measure] = value
+        self.received += 1
+        return True
+
+    def _is_fresh(self, location, now):
+        return location in self._times and now - self._times[location] <= self._max_age_s
+
+    def stale_locations(self):
+        """ Return the remote sensor locations which have no fresh readings from the LAN, so must be read from Timestream. """
+        now = int(time.time())
+        return [location for location in self._remote_sensor_locations if not self._is_fresh(location, now)]
+
+    def merge(self, remote_readings : dict):
+        """ Return a copy of the table of remote readings ({location : {measure : value}}), with any fresh readings received
+            from the LAN taking precedence.
+        """
+        now = int(time.time())
+        readings = {}
+        for location, values in remote_readings.items():
+            readings[location] = dict(values)
+        for location, values in self._readings.items():
+            if self._is_fresh(location, now):
+                readings.setdefault(location, {}).update(values)
+        return readings
@@ -7,10 +7,16 @@
 # https://github.com/mark-gladding/weatherstation
 #
 
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
 import gc
 import machine
 import time
 
+_AWAKE_CURRENT_UA = 20000     # Approximate current drawn by an idle Pico W which is awake (WiFi off)
+
 class Power:
     """Class providing functions to sleep between readings.
 
@@ -30,6 +36,25 @@ class Power:
         self._sensor_read_period_s = sensor_read_period_s
         self._draw_power_period_s = draw_power_period_s
 
+    def select_sensor_mode(self, sensor, deep_sleep : bool):
+        """ Select the sensor mode with the lowest estimated current draw for sensor_read_period_s.
+            When deep sleeping, the Pico would otherwise be asleep while waiting for a forced conversion to complete,
+            so the time spent waiting is included in the estimate.
+
+        Args:
+            sensor (AtmosphericSensor): The sensor to configure.
+            deep_sleep (bool): True if the unit deep sleeps between readings.
+        """
+        best = None
+        for standby_ms, latency_ms, current_ua in sensor.get_mode_estimates(self._sensor_read_period_s):
+            if deep_sleep:
+                current_ua += _AWAKE_CURRENT_UA * latency_ms / (self._sensor_read_period_s * 1000)
+            if best == None or current_ua < best[1]:
+                best = (standby_ms, current_ua)
+        sensor.set_mode(best[0])
+        mode = 'forced mode' if best[0] == None else f'normal mode (standby {best[0]}ms)'
+        print(f'Sensor using {mode}, estimated {best[1]:.1f}uA.')
+
     def draw_power(self):
         """ Generate a power draw to keep the attached power bank alive
             by turning the WiFi off, on, connecting for a second and turning it back off.
@@ -41,6 +66,16 @@ class Power:
         time.sleep(1)
         self._connection.disconnect()
 
+    async def draw_power_async(self):
+        """ Same as draw_power(), but allows other tasks to run while connecting.
+        """
+
+        self._display.status('Power pulse.')
+        self._connection.disconnect()
+        await self._connection.connect_async()
+        await asyncio.sleep(1)
+        self._connection.disconnect()
+
     def get_seconds_until_next_reading(self):
         """ Return the number of seconds until the next sensor reading should be taken. 
         """
@@ -0,0 +1,67 @@
+# ReadingBuffer class
+#
+# Copyright (C) Mark Gladding 2023.
+#
+# MIT License (see the accompanying license file)
+#
+# https://github.com/mark-gladding/weatherstation
+#
+
+import _thread
+from array import array
+
+class ReadingBuffer:
+    """Class providing a fixed size, lock protected ring of sensor readings used to pass readings between the two cores.
+
+     Readings are stored in preallocated arrays (a uint32 time and float32 values per reading) rather than as objects,
+     so buffered readings don't fragment the heap. When the buffer is full, the oldest reading is dropped.
+    """
+    def __init__(self, capacity : int, values_per_reading : int = 3):
+        """Constructor
+
+        Args:
+            capacity (int): Maximum number of readings held by the buffer.
+            values_per_reading (int, optional): Number of values in each reading, after the time. Defaults to 3 (tempC, pres_hPa, humRH).
+        """
+        self._times = array('I', [0] * capacity)
+        self._values = array('f', [0] * (capacity * values_per_reading))
+        self._values_per_reading = values_per_reading
+        self._capacity = capacity
+        self._head = 0
+        self._count = 0
+        self._lock = _thread.allocate_lock()
+        self.dropped = 0        # Number of readings dropped because the buffer was full
+
+    def __len__(self):
+        return self._count
+
+    def put(self, reading):
+        """ Add a reading, a tuple of (current_time, values...), dropping the oldest reading if the buffer is full. """
+        self._lock.acquire()
+        try:
+            if self._count == self._capacity:
+                self._head = (self._head + 1) % self._capacity
+                self._count -= 1
+                self.dropped += 1
+            index = (self._head + self._count) % self._capacity
+            self._times[index] = int(reading[0])
+            offset = index * self._values_per_reading
+            for i in range(self._values_per_reading):
+                self._values[offset + i] = reading[i + 1]
+            self._count += 1
+        finally:
+            self._lock.release()
+
+    def get(self):
+        """ Remove and return the oldest reading as a tuple of (current_time, values...), or None if the buffer is empty. """
+        self._lock.acquire()
+        try:
+            if self._count == 0:
+                return None
+            offset = self._head * self._values_per_reading
+            reading = (self._times[self._head],) + tuple(self._values[offset:offset + self._values_per_reading])
+            self._head = (self._head + 1) % self._capacity
+            self._count -= 1
+            return reading
+        finally:
+            self._lock.release()
@@ -0,0 +1,58 @@
+# RingBuffer class
+#
+# Copyright (C) Mark Gladding 2023.
+#
+# MIT License (see the accompanying license file)
+#
+# https://github.com/mark-gladding/weatherstation
+#
+
+import _thread
+
+class RingBuffer:
+    """Class providing a fixed size, lock protected ring buffer used to pass items between the two cores.
+
+     When the buffer is full, the oldest item is dropped to make room for the new one.
+    """
+    def __init__(self, capacity : int):
+        """Constructor
+
+        Args:
+            capacity (int): Maximum number of items held by the buffer.
+        """
+        self._items = [None] * capacity
+        self._capacity = capacity
+        self._head = 0
+        self._count = 0
+        self._lock = _thread.allocate_lock()
+        self.dropped = 0        # Number of items dropped because the buffer was full
+
+    def __len__(self):
+        return self._count
+
+    def put(self, item):
+        """ Add an item to the buffer, dropping the oldest item if the buffer is full. """
+        self._lock.acquire()
+        try:
+            if self._count == self._capacity:
+                self._head = (self._head + 1) % self._capacity
+                self._count -= 1
+                self.dropped += 1
+            self._items[(self._head + self._count) % self._capacity] = item
+            self._count += 1
+        finally:
+            self._lock.release()
+
+    def get(self):
+        """ Remove and return the oldest item in the buffer, or None if the buffer is empty. """
+        self._lock.acquire()
+        try:
+            if self._count == 0:
+                return None
+            item = self._items[self._head]
+            self._items[self._head] = None
+            self._head = (self._head + 1) % self._capacity
+            self._count -= 1
+            return item
+        finally:
+            self._lock.release()
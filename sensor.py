@@ -7,23 +7,131 @@
 # https://github.com/mark-gladding/weatherstation
 #
 
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
 from PiicoDev_BME280 import PiicoDev_BME280
 import time
 
+MEASURES = ('temperature', 'pressure', 'humidity')
+_OVERSAMPLING_MODES = { 0 : 0, 1 : 1, 2 : 2, 4 : 3, 8 : 4, 16 : 5 }     # Oversampling -> BME280 mode
+_DEFAULT_MODES = (2, 5, 1)      # x2 temperature, x16 pressure, x1 humidity
+
 class AtmosphericSensor:
     """Class providing functions to read the PiicoDev_BME280 atmospheric sensor.
+
+     Each measure can be sampled at its own period and oversampling. Measures which aren't due aren't converted,
+     and are returned as NaN (so they aren't uploaded).
     """    
-    def __init__(self):
+    def __init__(self, measure_settings : dict = None):
+        """Constructor
+
+        Args:
+            measure_settings (dict, optional): Settings for each measure, keyed by 'temperature', 'pressure' and 'humidity'.
+                Each is a dict with 'period_s' (sample period in seconds, rounded up to a whole number of readings, 0=every reading)
+                and 'oversampling' (1, 2, 4, 8 or 16, 0=disabled). Defaults to None (every measure on every reading).
+        """
         self._sensor = None
+        self._normal_mode = False
+        self._periods = [0, 0, 0]
+        self._modes = list(_DEFAULT_MODES)
+        if measure_settings:
+            for i, name in enumerate(MEASURES):
+                if name in measure_settings:
+                    self._periods[i] = measure_settings[name].get('period_s', 0)
+                    self._modes[i] = _OVERSAMPLING_MODES[measure_settings[name].get('oversampling', 1)]
+        self._last_slots = [None, None, None]   # Sample period slot of the last sample of each measure
 
-    def read_sensor(self):
+    def _get_sensor(self):
         if not self._sensor:
-            self._sensor = PiicoDev_BME280() # initialize the sensor
+            self._sensor = PiicoDev_BME280(t_mode=self._modes[0], p_mode=self._modes[1], h_mode=self._modes[2],
+                                           calibration_cache='bme280_calibration.bin') # initialize the sensor
+        return self._sensor
 
-        current_time = f'{time.time()}'
-        tempC, presPa, humRH = self._sensor.values() # read all data from the sensor
-        pres_hPa = presPa / 100 # convert air pressure Pascals -> hPa (or mbar, if you prefer)
+    def _get_due(self, now):
+        """ Return a list of flags indicating which measures are due to be sampled at time now. """
+        due = [False, False, False]
+        for i in range(len(MEASURES)):
+            if not self._modes[i]:
+                continue
+            slot = now // self._periods[i] if self._periods[i] else None
+            if slot == None or slot != self._last_slots[i]:
+                due[i] = True
+                self._last_slots[i] = slot
+        return due
+
+    def _start(self, due):
+        """ Configure the sensor to convert the measures which are due. Returns False if none are due. """
+        if not any(due):
+            return False
+        if not self._normal_mode:
+            modes = [mode if d else 0 for mode, d in zip(self._modes, due)]
+            if not modes[0]:
+                modes[0] = 1    # Temperature is needed to compensate pressure and humidity
+            self._get_sensor().set_oversampling(*modes)
+        return True
 
+    def _result(self, current_time, due, values):
+        nan = float('NaN')
+        tempC, presPa, humRH = [value if d else nan for value, d in zip(values, due)]
+        pres_hPa = presPa / 100 # convert air pressure Pascals -> hPa (or mbar, if you prefer)
         return current_time, tempC, pres_hPa, humRH
 
+    def read_sensor(self):
+        sensor = self._get_sensor()
+
+        current_time = int(time.time())
+        due = self._get_due(current_time)
+        values = (float('NaN'), float('NaN'), float('NaN'))
+        if self._start(due):
+            values = sensor.values() # read all data from the sensor
+
+        return self._result(current_time, due, values)
+
+    async def read_sensor_async(self):
+        """ Same as read_sensor(), but allows other tasks to run while the sensor is converting.
+        """
+        sensor = self._get_sensor()
+
+        current_time = int(time.time())
+        due = self._get_due(current_time)
+        values = (float('NaN'), float('NaN'), float('NaN'))
+        try:
+            if self._start(due):
+                await asyncio.sleep(sensor.start_measurement() / 1000)
+                raw = sensor.collect()
+                while raw == None:
+                    await asyncio.sleep(0.001)
+                    raw = sensor.collect()
+                values = sensor.values_from_raw(raw)
+        except Exception as e:
+            print(f'Failed to read sensor: {str(e)}')
+
+        return self._result(current_time, due, values)
+
+    def get_mode_estimates(self, read_period_s : int):
+        """ Return a list of (standby_ms, latency_ms, current_ua) estimates for each sensor mode, when read every read_period_s.
+            standby_ms is None for forced mode, otherwise it is the normal mode standby time.
+        """
+        sensor = self._get_sensor()
+        estimates = [(None,) + sensor.estimate_forced_mode(read_period_s)]
+        for standby_ms in sensor.standby_times_ms():
+            estimates.append((standby_ms,) + sensor.estimate_normal_mode(standby_ms))
+        return estimates
 
+    def set_mode(self, standby_ms):
+        """ Select forced mode (standby_ms = None) or normal mode with the given standby time.
+            In normal mode every enabled measure is converted continuously, and measures which aren't due are just discarded.
+        """
+        sensor = self._get_sensor()
+        if standby_ms == None:
+            self._normal_mode = False
+            sensor.set_forced_mode()
+        else:
+            modes = list(self._modes)
+            if any(modes) and not modes[0]:
+                modes[0] = 1    # Temperature is needed to compensate pressure and humidity
+            sensor.set_oversampling(*modes)
+            sensor.set_normal_mode(standby_ms)
+            self._normal_mode = True
@@ -14,6 +14,29 @@ import sys
 # Common settings
 
 sensor_read_period_s = 60     # Read the sensors every 60 seconds
+network_guard_s = 10          # Only start a network request if the next sensor reading is due in at least 10 seconds
+network_on_second_core = False  # If true, run uploads and remote sensor reads on the second core (the unit won't deep sleep)
+
+# Sample period and oversampling (1, 2, 4, 8 or 16, 0 = disabled) of each measure. Measures which aren't due aren't converted or uploaded.
+# Override in the location specific settings file, e.g. to sample pressure less often.
+measures = {
+    'temperature' : { 'period_s' : 60, 'oversampling' : 2 },
+    'pressure' : { 'period_s' : 60, 'oversampling' : 16 },
+    'humidity' : { 'period_s' : 60, 'oversampling' : 1 }
+}
+
+# Swinging door compression of readings before upload. Only the points needed to reconstruct each measure to within its
+# tolerance are uploaded, plus a heartbeat point every compression_heartbeat_s. None = upload every reading.
+# The heartbeat may also be set per measure, e.g. { 'pressure' : 3600 }. It must be several times a measure's period_s
+# for the measure to be compressed.
+compression_tolerances = None     # e.g. { 'temperature' : 0.1, 'pressure' : 0.05, 'humidity' : 0.5 }
+compression_heartbeat_s = 900
+
+# On-device aggregation, as an alternative to uploading every reading. Readings are aggregated into buckets of this many seconds,
+# and only the min, mean, max and count of each measure in each bucket is uploaded. Takes precedence over compression.
+# A bucket of 0 uploads every reading during that period (with a count of 1), e.g. set only the night bucket to aggregate at night.
+aggregate_day_bucket_s = 0       # 0 = upload readings rather than aggregates
+aggregate_night_bucket_s = 0     # e.g. 900
 
 # Time related settings. Update for your geographic location.
 ntp_time_server = 'au.pool.ntp.org'
@@ -21,11 +44,29 @@ sync_time_period_m = 30   # Sync the RTC with the ntp time server every 30 minut
 
 timezone_location = '-37.9707183%2C144.392352'  # Australia / Melbourne
 
+# Measures read from the remote sensors, for display. Temperature is shown large, humidity and pressure below it.
+remote_measures = ['temperature', 'humidity', 'pressure']
+
+# LAN peer exchange. Each station multicasts its latest reading to the other stations on the local network when it uploads.
+# Readings received this way are displayed in preference to those read from Timestream, while they are fresh.
+peer_exchange = False
+peer_group = '239.255.77.77'
+peer_port = 7777
+peer_max_age_s = 1800         # Fall back to reading from Timestream once the latest reading from the LAN is older than this
+peer_repeats = 3              # Send each reading this many times, as the stations are only connected briefly
+peer_repeat_interval_ms = 500
+
 # AWS Timestream Settings
 aws_region = 'ap-southeast-2'
 database_name = 'WeatherDb'
 sensor_readings_table = 'Weather'
 device_log_table = 'DeviceLog'
+multi_measure_records = False           # If true, upload each reading as a single multi-measure record rather than a record per measure
+remote_multi_measure_records = None     # Whether the remote sensors upload multi-measure records (None = the same as this sensor)
+
+# Upload queue settings. Readings waiting to be uploaded are kept on flash so they survive a reset.
+upload_queue_max_readings = 1440    # Keep at most 1 day of readings (older readings are dropped)
+upload_queue_sync_period = 10       # Write buffered readings to flash every 10 readings (and before every upload)
 
 
 display_cycle_period_ms = 5000  # Time to display a reading on the display before moving to the next reading (e.g remote sensor temperature).
@@ -48,4 +89,9 @@ try:
 except OSError:
     sys.exit(f'Cannot load location specific settings file {settings_file}.')
 
+# Older settings files name a single remote sensor, rather than a list.
+if 'remote_sensor_locations' not in location_settings:
+    remote_location = location_settings.get('remote_sensor_location')
+    remote_sensor_locations = [remote_location] if remote_location else []
+
 
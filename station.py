@@ -0,0 +1,293 @@
+# Station class
+#
+# Copyright (C) Mark Gladding 2023.
+#
+# MIT License (see the accompanying license file)
+#
+# https://github.com/mark-gladding/weatherstation
+#
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+import gc
+import time
+
+def _time_ms():
+    return time.time_ns() // 1000000
+
+class Station:
+    """Class running the weather station as a set of uasyncio tasks.
+
+     Sampling, upload, remote sensor reads, time sync, power draws and display cycling each run in their own task.
+     Network requests block, so the network tasks only start a request when it can complete before the next reading is due.
+    """
+    def __init__(self, display, connection, power, sensor, ntptime, timestream, upload_queue,
+                 sensor_location : str, remote_sensor_locations : list, sensor_read_period_s : int, draw_power_period_s : int,
+                 day_upload_period : int, night_upload_period : int, deep_sleep : bool, network_guard_s : int,
+                 reducer=None, network_worker=None, status_relay=None, peers=None):
+        """Constructor
+
+        Args:
+            sensor_location (str): Name of the location of this sensor.
+            remote_sensor_locations (list): Names of the remote sensors to display (may be empty).
+            sensor_read_period_s (int): Period in seconds between sensor reads.
+            draw_power_period_s (int): Period in seconds between power draws (0=disable power draws) on a power bank.
+            day_upload_period (int): Number of readings between uploads during the day.
+            night_upload_period (int): Number of readings between uploads during the night.
+            deep_sleep (bool): True to deep sleep between readings, even during the day.
+            network_guard_s (int): A network request will only be started if the next reading is due in at least this many seconds.
+            reducer (Compressor or Aggregator, optional): If supplied, readings are compressed or aggregated before they are queued for upload. Defaults to None.
+            network_worker (NetworkWorker, optional): If supplied, uploads, remote reads and time syncs are run by this worker on the second core.
+                As the second core keeps running, the station never deep sleeps in this mode. Defaults to None.
+            status_relay (StatusRelay, optional): Relays status messages from the network worker to the display. Defaults to None.
+            peers (PeerExchange, optional): If supplied, the latest reading is multicast to the other stations on the LAN after each upload,
+                and fresh readings received from them are displayed in preference to those read from Timestream.
+                When there is a network worker, pass this to the worker instead. Defaults to None.
+        """
+        self._display = display
+        self._connection = connection
+        self._power = power
+        self._sensor = sensor
+        self._ntptime = ntptime
+        self._timestream = timestream
+        self._upload_queue = upload_queue
+        self._sensor_location = sensor_location
+        self._remote_sensor_locations = remote_sensor_locations
+        self._sensor_read_period_ms = sensor_read_period_s * 1000
+        self._draw_power_period_s = draw_power_period_s
+        self._day_upload_period = day_upload_period
+        self._night_upload_period = night_upload_period
+        self._deep_sleep = deep_sleep
+        self._network_guard_ms = network_guard_s * 1000
+        self._reducer = reducer
+        self._network_worker = network_worker
+        self._status_relay = status_relay
+        self._peers = peers
+
+        self._upload_due = asyncio.Event()
+        self._remote_read_due = asyncio.Event()
+        self._time_sync_due = asyncio.Event()
+        self._network_lock = asyncio.Lock()
+        self._network_jobs = 0
+        self._next_sample_ms = 0
+        self._upload_countdown = 0
+        self._tempC = float('NaN')
+        self._local_time_string = ''
+        self._latest_reading = None
+        self.remote_readings = {}   # Latest remote readings, {location : {measure : value}}
+
+        # Timestamp jitter statistics, i.e. how late each reading was taken compared to when it was due.
+        self.samples = 0
+        self.max_jitter_ms = 0
+        self.total_jitter_ms = 0
+        self.busy_ms = 0            # Time spent working on this core (excluding display cycling)
+
+    def _get_upload_period(self):
+        return self._day_upload_period if self._ntptime.is_day() else self._night_upload_period
+
+    def _is_deep_sleep(self):
+        if self._network_worker:
+            return False
+        return self._deep_sleep or not self._ntptime.is_day()
+
+    def mean_jitter_ms(self):
+        return self.total_jitter_ms / self.samples if self.samples else 0
+
+    def _schedule_next_sample(self):
+        """ Schedule the next reading on the next sensor_read_period_s boundary. """
+        now_ms = _time_ms()
+        next_sample_ms = self._next_sample_ms + self._sensor_read_period_ms
+        if next_sample_ms <= now_ms:    # First reading, or a reading was missed.
+            next_sample_ms = (now_ms // self._sensor_read_period_ms + 1) * self._sensor_read_period_ms
+        self._next_sample_ms = next_sample_ms
+
+    def _request(self, event):
+        """ Request a network task to run, keeping track of the network tasks still to complete. """
+        if not event.is_set():
+            self._network_jobs += 1
+            event.set()
+
+    async def _wait_for_network_idle(self):
+        """ Wait until the network tasks are complete. Returns False if the next reading fell due first.
+            The network tasks wait for the reading to be taken before starting another request, so it can't wait for them.
+        """
+        while self._network_jobs > 0:
+            if _time_ms() >= self._next_sample_ms:
+                return False
+            await asyncio.sleep(0.1)
+        return True
+
+    async def _wait_for_sample_window(self):
+        """ Wait until a blocking network request can complete before the next reading is due. """
+        while True:
+            remaining_ms = self._next_sample_ms - _time_ms()
+            if remaining_ms >= self._network_guard_ms:
+                return
+            await asyncio.sleep(max(0, remaining_ms + 100) / 1000)
+
+    def _remote_locations_to_read(self):
+        """ Return the remote sensors to read from Timestream. Those with fresh readings from the LAN don't need to be read. """
+        return self._peers.stale_locations() if self._peers else self._remote_sensor_locations
+
+    def _update_display(self):
+        remote_readings = self._peers.merge(self.remote_readings) if self._peers else self.remote_readings
+        self._display.update_readings(self._local_time_string, self._sensor_location, self._tempC, self._remote_sensor_locations, remote_readings)
+
+    async def take_reading(self):
+        """ Read the sensor, update the display and queue the reading for upload. """
+        current_time, tempC, pres_hPa, humRH = await self._sensor.read_sensor_async()
+        start_ms = _time_ms()
+        if tempC == tempC:      # Keep displaying the last temperature when it wasn't sampled (NaN)
+            self._tempC = tempC
+        self._local_time_string = self._ntptime.get_local_time_string(current_time)
+        self._update_display()
+        reading = (current_time, tempC, pres_hPa, humRH)
+        self._latest_reading = reading
+        readings = self._reducer.add(*reading) if self._reducer else [reading]
+        if self._network_worker:
+            self._network_worker.latest_reading = reading
+            for reading in readings:
+                self._network_worker.readings.put(reading)
+            self._network_worker.samples += 1
+            self.busy_ms += _time_ms() - start_ms
+            return
+        for reading in readings:
+            self._upload_queue.append(*reading)
+        self.busy_ms += _time_ms() - start_ms
+        self._upload_countdown -= 1
+        if self._upload_countdown <= 0 and self._upload_queue.count() > 0:
+            self._request(self._upload_due)
+
+    async def sample_task(self):
+        """ Task which takes a reading every sensor_read_period_s, on the boundary of the period. """
+        self._upload_countdown = self._get_upload_period()
+        self._schedule_next_sample()
+        while True:
+            await asyncio.sleep(max(0, self._next_sample_ms - _time_ms()) / 1000)
+            jitter_ms = _time_ms() - self._next_sample_ms
+            self.samples += 1
+            self.total_jitter_ms += jitter_ms
+            self.max_jitter_ms = max(self.max_jitter_ms, jitter_ms)
+            self._schedule_next_sample()
+            await self.take_reading()
+            if self._is_deep_sleep():
+                # Nothing else needs to run until the next reading, once the network tasks are complete.
+                # If they are still running when it is due (e.g. uploading a backlog), take it without sleeping.
+                network_idle = await self._wait_for_network_idle()
+                gc.collect()
+                if network_idle:
+                    self._power.deep_sleep_until_next_reading()
+            else:
+                gc.collect()
+
+    async def upload_task(self):
+        """ Task which uploads the queued readings when requested by the sample task. """
+        while True:
+            await self._upload_due.wait()
+            self._upload_due.clear()
+            try:
+                async with self._network_lock:
+                    if await self._connection.connect_async():
+                        self._upload_countdown = self._get_upload_period()
+                        if self._ntptime.is_sync_due():
+                            self._request(self._time_sync_due)
+                        uploaded = True
+                        while uploaded and self._upload_queue.count() > 0:
+                            await self._wait_for_sample_window()
+                            start_ms = _time_ms()
+                            uploaded = self._timestream.upload_queued_readings(self._upload_queue, max_chunks=1)
+                            self.busy_ms += _time_ms() - start_ms
+                        if self._peers and self._latest_reading:
+                            await self._peers.send_async(*self._latest_reading)
+                        if self._remote_locations_to_read():
+                            self._request(self._remote_read_due)
+            finally:
+                self._network_jobs -= 1
+
+    async def remote_read_task(self):
+        """ Task which reads the latest remote sensor readings after each upload. """
+        while True:
+            await self._remote_read_due.wait()
+            self._remote_read_due.clear()
+            try:
+                async with self._network_lock:
+                    if self._connection.is_connected():
+                        await self._wait_for_sample_window()
+                        start_ms = _time_ms()
+                        self.remote_readings = self._timestream.read_remote_sensors(self.remote_readings, self._remote_locations_to_read())
+                        self.busy_ms += _time_ms() - start_ms
+            finally:
+                self._network_jobs -= 1
+
+    async def time_sync_task(self):
+        """ Task which resynchronises the RTC with the ntp time server, when due, while connected. """
+        while True:
+            await self._time_sync_due.wait()
+            self._time_sync_due.clear()
+            try:
+                async with self._network_lock:
+                    if self._connection.is_connected():
+                        await self._wait_for_sample_window()
+                        start_ms = _time_ms()
+                        self._ntptime.sync_time()
+                        self.busy_ms += _time_ms() - start_ms
+            finally:
+                self._network_jobs -= 1
+
+    async def peer_task(self):
+        """ Task which receives the readings multicast by the remote stations on the LAN, and displays them as they arrive. """
+        while True:
+            await asyncio.sleep(1)
+            if self._peers.receive():
+                self._update_display()
+
+    async def power_draw_task(self):
+        """ Task which periodically draws power to keep an attached power bank alive, while the unit is awake. """
+        while True:
+            await asyncio.sleep(self._power.get_seconds_until_next_power_draw())
+            if self._is_deep_sleep() or self._next_sample_ms - _time_ms() < self._network_guard_ms:
+                continue
+            if self._network_worker:
+                # Skip the power draw if the network worker is using the connection (which draws power anyway).
+                if not self._network_worker.network_lock.acquire(0):
+                    continue
+                try:
+                    await self._power.draw_power_async()
+                finally:
+                    self._network_worker.network_lock.release()
+            else:
+                async with self._network_lock:
+                    await self._power.draw_power_async()
+
+    async def network_worker_task(self):
+        """ Task which passes messages and remote sensor readings from the network worker on the second core
+            to this core, and raises any exception which stopped the worker.
+        """
+        while True:
+            await asyncio.sleep(0.1)
+            if self._network_worker.exception:
+                raise self._network_worker.exception
+            remote_readings = self._network_worker.remote_readings.get()
+            while remote_readings != None:
+                self.remote_readings = remote_readings
+                remote_readings = self._network_worker.remote_readings.get()
+            message = self._status_relay.messages.get() if self._status_relay else None
+            while message:
+                text, flashcount = message
+                self._display.status(text, flashcount)
+                message = self._status_relay.messages.get()
+
+    async def run(self):
+        """ Run all the tasks. Any exception raised by a task is propagated to the caller. """
+        if self._network_worker:
+            self._network_worker.start()
+            tasks = [self.sample_task(), self.network_worker_task(), self._display.run()]
+        else:
+            tasks = [self.sample_task(), self.upload_task(), self.remote_read_task(), self.time_sync_task(), self._display.run()]
+        if self._draw_power_period_s > 0:
+            tasks.append(self.power_draw_task())
+        if self._peers and self._remote_sensor_locations:
+            tasks.append(self.peer_task())
+        await asyncio.gather(*tasks)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules are deployed flat to the Pico, so make the repository root importable.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,72 @@
+# Aggregator tests, covering the change between day and night buckets (including a bucket of 0, i.e. no aggregation).
+
+import unittest
+
+from aggregator import Aggregator, VALUES_PER_READING
+
+class _NtpTime:
+    def __init__(self):
+        self.day = True
+
+    def is_day(self):
+        return self.day
+
+class AggregatorTest(unittest.TestCase):
+    def _add(self, aggregator, start, count, period_s=60):
+        readings = []
+        for t in range(start, start + count * period_s, period_s):
+            readings.extend(aggregator.add(t, 20.0 + (t // period_s) % 3, 1000.0, 50.0))
+        return readings
+
+    def assert_layout(self, readings):
+        for reading in readings:
+            self.assertEqual(len(reading), 1 + VALUES_PER_READING)
+
+    def test_aggregate_day_and_night(self):
+        ntptime = _NtpTime()
+        aggregator = Aggregator(ntptime, day_bucket_s=300, night_bucket_s=900)
+        readings = self._add(aggregator, 0, 10)
+        self.assertEqual([reading[0] for reading in readings], [0])
+        self.assertEqual((readings[0][1], readings[0][3], readings[0][4]), (20.0, 22.0, 5))
+        self.assertAlmostEqual(readings[0][2], 20.8, places=5)
+        ntptime.day = False
+        readings = self._add(aggregator, 600, 20)
+        self.assertEqual([reading[0] for reading in readings], [300, 600])     # The night bucket doesn't overlap the day bucket
+        self.assert_layout(readings)
+
+    def test_aggregate_only_at_night(self):
+        ntptime = _NtpTime()
+        aggregator = Aggregator(ntptime, day_bucket_s=0, night_bucket_s=900)
+        # Day readings are passed through, with a count of 1.
+        readings = self._add(aggregator, 0, 3)
+        self.assertEqual([reading[0] for reading in readings], [0, 60, 120])
+        self.assertEqual(readings[1][1:5], (21.0, 21.0, 21.0, 1))
+        # Day -> night: readings are aggregated.
+        ntptime.day = False
+        readings = self._add(aggregator, 180, 15)
+        self.assertEqual([reading[0] for reading in readings], [180])
+        self.assertEqual(readings[0][4], 12)
+        # Night -> day: the open bucket is emitted, followed by the reading passed through.
+        ntptime.day = True
+        readings = aggregator.add(1080, 20.0, float('NaN'), 50.0)
+        self.assertEqual([reading[0] for reading in readings], [900, 1080])
+        self.assertEqual(readings[0][4], 3)
+        self.assertNotEqual(readings[1][5], readings[1][5])    # Pressure wasn't sampled
+        self.assert_layout(readings)
+        self.assertEqual(aggregator.flush(), ())
+
+    def test_aggregate_only_during_the_day(self):
+        ntptime = _NtpTime()
+        ntptime.day = False
+        aggregator = Aggregator(ntptime, day_bucket_s=900, night_bucket_s=0)
+        self.assertEqual(len(self._add(aggregator, 0, 3)), 3)
+        ntptime.day = True
+        self.assertEqual(self._add(aggregator, 180, 12), [])
+        ntptime.day = False
+        readings = self._add(aggregator, 900, 1)
+        self.assertEqual([reading[0] for reading in readings], [180, 900])
+        self.assertEqual(readings[0][4], 12)
+        self.assert_layout(readings)
+
+if __name__ == '__main__':
+    unittest.main()
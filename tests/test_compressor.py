@@ -0,0 +1,107 @@
+# Compressor tests. Replays a day of readings through the compressor with the outside station's settings, checking the
+# reconstruction error of each measure and that each time is only uploaded once.
+#
+# Run as a script to print the compression ratio and maximum error of each measure, optionally for a recorded day:
+#   python tests/test_compressor.py [readings.csv]
+# where each line of the csv file is time,tempC,pres_hPa,humRH (empty or nan for a measure which wasn't sampled).
+
+import json
+import math
+import os
+import random
+import sys
+import unittest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if __name__ == '__main__':      # Run as a script, rather than by pytest (which uses conftest.py)
+    sys.path.insert(0, _ROOT)
+from compressor import Compressor
+from sensor import MEASURES
+
+_SETTINGS_FILE = os.path.join(_ROOT, 'settings_outside.json')
+
+def _outside_settings():
+    with open(_SETTINGS_FILE) as f:
+        return json.load(f)
+
+def synthetic_day(days=1, seed=3):
+    """ Return days of per-minute readings (diurnal cycle, a front, sensor noise, rounded like the BME280 output),
+        with each measure only sampled on its period in the outside station's settings.
+    """
+    random.seed(seed)
+    periods = [_outside_settings()['measures'][name]['period_s'] for name in MEASURES]
+    start = 1700000000
+    readings = []
+    for k in range(1440 * days):
+        t = start + 60 * k
+        h = (k / 60) % 24
+        tempC = 12 + 6 * math.sin((h - 9) / 24 * 2 * math.pi) + (-6 * (h - 15) if 15 < h < 15.5 else 0) + random.gauss(0, 0.02)
+        pres_hPa = 1013 + 2 * math.sin(h / 24 * 2 * math.pi) + random.gauss(0, 0.01)
+        humRH = 60 - 15 * math.sin((h - 9) / 24 * 2 * math.pi) + random.gauss(0, 0.1)
+        values = [round(v, 2) if (t - start) % period == 0 else float('NaN') for v, period in zip((tempC, pres_hPa, humRH), periods)]
+        readings.append((t, *values))
+    return readings
+
+def load_readings(path):
+    readings = []
+    with open(path) as f:
+        for line in f:
+            fields = line.strip().split(',')
+            if len(fields) == 4 and fields[0].isdigit():
+                readings.append((int(fields[0]), *[float(v) if v else float('NaN') for v in fields[1:]]))
+    return readings
+
+def replay(readings, tolerances, heartbeat_s):
+    """ Compress the readings. Returns the readings emitted and, for each measure, (samples, points emitted, maximum error). """
+    compressor = Compressor(tolerances, heartbeat_s)
+    emitted = []
+    for reading in readings:
+        emitted += compressor.add(*reading)
+    emitted += compressor.flush()
+    stats = []
+    for i in range(len(MEASURES)):
+        points = [(r[0], r[i + 1]) for r in emitted if r[i + 1] == r[i + 1]]
+        samples = [(r[0], r[i + 1]) for r in readings if r[i + 1] == r[i + 1]]
+        error = 0
+        j = 0
+        for t, value in samples:
+            # Linear interpolation between the emitted points either side of the sample
+            while j + 2 < len(points) and points[j + 1][0] < t:
+                j += 1
+            (t0, v0), (t1, v1) = points[j], points[min(j + 1, len(points) - 1)]
+            reconstructed = v0 if t1 == t0 else v0 + (v1 - v0) * (t - t0) / (t1 - t0)
+            error = max(error, abs(reconstructed - value))
+        stats.append((len(samples), len(points), error))
+    return emitted, stats
+
+class CompressorTest(unittest.TestCase):
+    def setUp(self):
+        settings = _outside_settings()
+        self.tolerances = settings['compression_tolerances']
+        self.heartbeat_s = settings.get('compression_heartbeat_s', 900)
+        self.emitted, self.stats = replay(synthetic_day(days=3), self.tolerances, self.heartbeat_s)
+
+    def test_error_within_tolerance(self):
+        for name, (samples, points, error) in zip(MEASURES, self.stats):
+            self.assertLessEqual(error, self.tolerances[name] + 1e-9, name)
+
+    def test_every_measure_is_compressed(self):
+        for name, (samples, points, error) in zip(MEASURES, self.stats):
+            self.assertLess(points, samples, name)
+
+    def test_each_time_emitted_once(self):
+        times = [reading[0] for reading in self.emitted]
+        self.assertEqual(len(times), len(set(times)))
+        self.assertEqual(times, sorted(times))
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        settings = _outside_settings()
+        readings = load_readings(sys.argv[1])
+        emitted, stats = replay(readings, settings['compression_tolerances'], settings.get('compression_heartbeat_s', 900))
+        for name, (samples, points, error) in zip(MEASURES, stats):
+            print(f'{name}: {samples} samples -> {points} points ({samples / max(points, 1):.1f}:1), max error {error:.3f}'
+                  f' (tolerance {settings["compression_tolerances"][name]})')
+        print(f'{len(readings)} readings -> {len(emitted)} uploaded')
+    else:
+        unittest.main()
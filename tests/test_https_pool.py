@@ -0,0 +1,82 @@
+# HttpsPool tests, run under CPython with streams standing in for the TLS connections.
+
+import errno
+import socket
+import unittest
+
+from https_pool import HttpsPool, is_timeout
+
+_RESPONSE = b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}'
+
+class _Stream:
+    """ Stream which fails as requested, or returns a response once the request has been written. """
+    def __init__(self, write_error=None, read_error=None, response=_RESPONSE):
+        self.write_error = write_error
+        self.read_error = read_error
+        self.response = response
+        self.written = 0
+        self.offset = 0
+
+    def write(self, data):
+        if self.write_error:
+            raise self.write_error
+        self.written += len(data)
+
+    def readline(self):
+        if self.read_error:
+            raise self.read_error
+        end = self.response.find(b'\n', self.offset) + 1 or len(self.response)
+        line = self.response[self.offset:end]
+        self.offset = end
+        return line
+
+    def read(self, size):
+        data = self.response[self.offset:self.offset + size]
+        self.offset += len(data)
+        return data
+
+    def close(self):
+        pass
+
+class _Pool(HttpsPool):
+    """ Pool whose new connections are the streams given, rather than sockets. """
+    def __init__(self, idle_stream, new_streams):
+        super().__init__()
+        self._connections['host'] = (idle_stream, idle_stream)
+        self._new_streams = new_streams
+
+    def _open(self, host):
+        stream = self._new_streams.pop(0)
+        self._connections[host] = (stream, stream)
+        return (stream, stream)
+
+class StaleConnectionTest(unittest.TestCase):
+    def _post(self, idle_stream):
+        new_stream = _Stream()
+        pool = _Pool(idle_stream, [new_stream])
+        return pool, new_stream, pool.post('host', {}, '{}')
+
+    def test_resent_when_closed_before_the_response(self):
+        for idle_stream in (_Stream(response=b''), _Stream(write_error=BrokenPipeError(errno.EPIPE, 'broken pipe')),
+                            _Stream(read_error=ConnectionResetError(errno.ECONNRESET, 'reset'))):
+            pool, new_stream, response = self._post(idle_stream)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(pool.stale_reconnects, 1)
+            self.assertGreater(new_stream.written, 0)
+
+    def test_timeout_waiting_for_the_response_is_not_resent(self):
+        idle_stream = _Stream(read_error=socket.timeout('timed out'))
+        pool = _Pool(idle_stream, [])
+        with self.assertRaises(OSError):
+            pool.post('host', {}, '{}')
+        self.assertEqual(pool.stale_reconnects, 0)
+        self.assertEqual(pool.open_sockets(), 0)
+
+    def test_is_timeout(self):
+        self.assertTrue(is_timeout(socket.timeout('timed out')))
+        self.assertTrue(is_timeout(OSError(errno.ETIMEDOUT)))     # MicroPython
+        self.assertFalse(is_timeout(ConnectionResetError(errno.ECONNRESET, 'reset')))
+        self.assertFalse(is_timeout(ValueError('not a socket error')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# NetworkWorker tests, run under CPython with a thread standing in for the second core.
+
+import threading
+import time
+import unittest
+
+from network_worker import NetworkWorker
+
+class _Connection:
+    def connect(self):
+        return True
+
+class _NtpTime:
+    def is_day(self):
+        return True
+
+    def sync_time(self):
+        pass
+
+class _UploadQueue:
+    values_per_reading = 3
+
+    def __init__(self):
+        self.readings = []
+        self.thread = None      # The last thread to access the queue
+
+    def _access(self):
+        self.thread = threading.current_thread()
+
+    def append(self, *reading):
+        self._access()
+        self.readings.append(reading)
+
+    def count(self):
+        self._access()
+        return len(self.readings)
+
+class _Timestream:
+    def __init__(self):
+        self.uploading = False
+        self.uploads = 0
+
+    def upload_queued_readings(self, upload_queue):
+        self.uploading = True
+        time.sleep(0.3)
+        upload_queue._access()
+        upload_queue.readings.clear()
+        self.uploads += 1
+        self.uploading = False
+
+class NetworkWorkerTest(unittest.TestCase):
+    def _worker(self):
+        self.upload_queue = _UploadQueue()
+        self.timestream = _Timestream()
+        return NetworkWorker(connection=_Connection(), ntptime=_NtpTime(), timestream=self.timestream,
+                             upload_queue=self.upload_queue, remote_sensor_locations=[],
+                             day_upload_period=2, night_upload_period=2)
+
+    def test_stop_before_start(self):
+        self.assertTrue(self._worker().stop(timeout_ms=0))
+
+    def test_stop_waits_for_the_upload(self):
+        worker = self._worker()
+        worker.start()
+        for t in range(2):
+            worker.readings.put((t, 20.0, 1000.0, 50.0))
+            worker.samples += 1
+        deadline = time.time() + 2
+        while not self.timestream.uploading and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(self.timestream.uploading)
+        self.assertTrue(worker.stop())
+        self.assertEqual(self.timestream.uploads, 1)
+        # Once stopped, readings are left for the first core and the second core no longer accesses the queue.
+        worker.readings.put((2, 20.0, 1000.0, 50.0))
+        time.sleep(0.2)
+        self.assertEqual(len(worker.readings), 1)
+        self.upload_queue.append(*worker.readings.get())
+        self.assertIs(self.upload_queue.thread, threading.current_thread())
+
+    def test_stop_times_out(self):
+        worker = self._worker()
+        worker.start()
+        for t in range(2):
+            worker.readings.put((t, 20.0, 1000.0, 50.0))
+            worker.samples += 1
+        deadline = time.time() + 2
+        while not self.timestream.uploading and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(worker.stop(timeout_ms=50))
+        self.assertTrue(worker.stop())
+
+if __name__ == '__main__':
+    unittest.main()
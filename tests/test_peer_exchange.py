@@ -0,0 +1,129 @@
+# PeerExchange tests. Two stations exchange readings over UDP multicast on the loopback interface, under CPython.
+
+import asyncio
+import random
+import socket
+import sys
+import time
+import types
+import unittest
+
+class _WLAN:
+    """ Stand-in for network.WLAN, which is connected while active. """
+    def __init__(self, interface):
+        self._active = False
+
+    def active(self, value=None):
+        if value == None:
+            return self._active
+        self._active = value
+
+    def isconnected(self):
+        return self._active
+
+    def connect(self, ssid, password):
+        pass
+
+    def status(self):
+        return 3
+
+    def disconnect(self):
+        pass
+
+sys.modules.setdefault('network', types.SimpleNamespace(STA_IF=0, WLAN=_WLAN))
+
+from connection import Connection
+from peer_exchange import PeerExchange
+
+_GROUP = '239.255.77.77'
+_NAN = float('NaN')
+
+def _wait_for_datagrams():
+    time.sleep(0.1)
+
+class PeerExchangeTest(unittest.TestCase):
+    def setUp(self):
+        self.port = random.randint(40000, 60000)
+        self.outside_connection = Connection('ssid', 'password', False)
+        self.office_connection = Connection('ssid', 'password', False)
+        self.outside = self._create(self.outside_connection, 'outside', [])
+        self.office = self._create(self.office_connection, 'office', ['outside'])
+        asyncio.run(self.outside_connection.connect_async())
+        asyncio.run(self.office_connection.connect_async())
+
+    def tearDown(self):
+        self.outside_connection.disconnect()
+        self.office_connection.disconnect()
+
+    def _create(self, connection, location, remote_locations):
+        peers = PeerExchange(connection, location, remote_locations, _GROUP, self.port, 1800, repeats=3, repeat_interval_ms=50)
+        connection.peers = peers
+        return peers
+
+    def test_reading_received(self):
+        now = int(time.time())
+        self.outside.send(now, 12.5, 1009.25, 80.0)
+        _wait_for_datagrams()
+        self.assertTrue(self.office.receive())
+        self.assertFalse(self.office.receive())
+        self.assertEqual(self.office.merge({}), {'outside': {'temperature': 12.5, 'pressure': 1009.25, 'humidity': 80.0}})
+        self.assertEqual(self.office.stale_locations(), [])
+        self.assertEqual(self.outside.sent, 3)
+        self.assertEqual(self.office.received, 1)     # The repeats are ignored
+
+    def test_unsampled_out_of_order_and_junk_ignored(self):
+        now = int(time.time())
+        self.outside.send(now - 60, 12.5, 1009.25, 80.0)
+        self.outside.send(now, 12.75, _NAN, 81.0)
+        self.outside.send(now - 120, 99.0, 99.0, 99.0)
+        junk = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        junk.sendto(b'junk', (_GROUP, self.port))
+        junk.sendto(b'WS\x02' + bytes(30), (_GROUP, self.port))
+        junk.close()
+        _wait_for_datagrams()
+        self.office.receive()
+        self.assertEqual(self.office.merge({'outside': {'temperature': 11.0}}),
+                         {'outside': {'temperature': 12.75, 'pressure': 1009.25, 'humidity': 81.0}})
+
+    def test_stale_readings_fall_back_to_timestream(self):
+        self.outside.send(int(time.time()) - 3600, 12.5, 1009.25, 80.0)
+        _wait_for_datagrams()
+        self.office.receive()
+        self.assertEqual(self.office.stale_locations(), ['outside'])
+        self.assertEqual(self.office.merge({'outside': {'temperature': 11.0}}), {'outside': {'temperature': 11.0}})
+
+    def test_received_while_briefly_connected(self):
+        # The office only connects for a moment (e.g. a power draw) while the outside station is sending.
+        # The datagrams received while connected are read when it disconnects, and reported by the next receive().
+        self.office_connection.disconnect()
+        self.assertIsNone(self.office._socket)
+
+        async def run():
+            async def office_power_draw():
+                await asyncio.sleep(0.03)
+                await self.office_connection.connect_async()
+                await asyncio.sleep(0.05)
+                self.office_connection.disconnect()
+            await asyncio.gather(self.outside.send_async(int(time.time()), 12.5, 1009.25, 80.0), office_power_draw())
+
+        asyncio.run(run())
+        self.assertFalse(self.office_connection.is_connected())
+        self.assertTrue(self.office.receive())
+        self.assertEqual(self.office.merge({})['outside']['temperature'], 12.5)
+
+    def test_socket_reopened_after_reconnecting(self):
+        self.office_connection.disconnect()
+        self.outside_connection.disconnect()
+        self.assertIsNone(self.office._socket)
+        self.assertIsNone(self.outside._socket)
+        self.outside.send(int(time.time()), 1.0, 2.0, 3.0)     # Not connected, so not sent
+        self.assertEqual(self.outside.sent, 0)
+        asyncio.run(self.office_connection.connect_async())
+        asyncio.run(self.outside_connection.connect_async())
+        self.outside.send(int(time.time()), 13.0, _NAN, _NAN)
+        _wait_for_datagrams()
+        self.assertTrue(self.office.receive())
+        self.assertEqual(self.office.merge({}), {'outside': {'temperature': 13.0}})
+
+if __name__ == '__main__':
+    unittest.main()
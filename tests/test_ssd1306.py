@@ -0,0 +1,117 @@
+# Tests of the framebuffer used on Linux (and micro:bit), comparing it with a model of MicroPython's framebuf.
+
+import random
+import unittest
+
+import PiicoDev_SSD1306
+from PiicoDev_SSD1306 import HEIGHT, WIDTH
+
+class _I2C:
+    """ Stand-in for the I2C bus, counting the bytes written. """
+    def __init__(self):
+        self.bytes = 0
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self.bytes += 2 + len(buf)
+
+def create_display():
+    """ Return a Linux display on a stand-in I2C bus. """
+    i2c = _I2C()
+    create_unified_i2c = PiicoDev_SSD1306.create_unified_i2c
+    PiicoDev_SSD1306.create_unified_i2c = lambda **kwargs: i2c
+    try:
+        display = PiicoDev_SSD1306.PiicoDev_SSD1306_Linux()
+    finally:
+        PiicoDev_SSD1306.create_unified_i2c = create_unified_i2c
+    return display, i2c
+
+class ReferenceFrameBuffer:
+    """ Pixel by pixel model of MicroPython's framebuf (extmod/modframebuf.c) for a MONO_VLSB buffer. """
+    def __init__(self):
+        self.buffer = bytearray(WIDTH * HEIGHT // 8)
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < WIDTH and 0 <= y < HEIGHT):
+            return None
+        index = (y >> 3) * WIDTH + x
+        if c is None:
+            return self.buffer[index] >> (y & 7) & 1
+        if c:
+            self.buffer[index] |= 1 << (y & 7)
+        else:
+            self.buffer[index] &= ~(1 << (y & 7))
+
+    def fill(self, c):
+        for x in range(WIDTH):
+            for y in range(HEIGHT):
+                self.pixel(x, y, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        for j in range(y, y + h):
+            for i in range(x, x + w):
+                self.pixel(i, j, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c):
+        # Four fill_rect calls, each ignored if empty.
+        self.fill_rect(x, y, w, 1, c)
+        self.fill_rect(x, y + h - 1, w, 1, c)
+        self.fill_rect(x, y, 1, h, c)
+        self.fill_rect(x + w - 1, y, 1, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        # Only horizontal and vertical lines are compared, as sloping lines are drawn by the same Bresenham code as before.
+        for x in range(min(x1, x2), max(x1, x2) + 1):
+            for y in range(min(y1, y2), max(y1, y2) + 1):
+                self.pixel(x, y, c)
+
+class FrameBufferTest(unittest.TestCase):
+    def test_random_operations_match_framebuf(self):
+        display, i2c = create_display()
+        reference = ReferenceFrameBuffer()
+        display.fill(0)
+        start_bytes = i2c.bytes
+        rng = random.Random(5)
+        x = lambda: rng.randint(-20, WIDTH + 20)
+        y = lambda: rng.randint(-20, HEIGHT + 20)
+        length = lambda: rng.randint(-3, WIDTH + 10)
+        for n in range(5000):
+            c = rng.randint(0, 1)
+            operation = rng.choice(['pixel', 'hline', 'vline', 'rect', 'fill_rect', 'line', 'fill'])
+            if operation == 'pixel':
+                args = (x(), y(), c)
+            elif operation in ('hline', 'vline'):
+                args = (x(), y(), length(), c)
+            elif operation in ('rect', 'fill_rect'):
+                args = (x(), y(), length(), rng.randint(-3, HEIGHT + 6), c)
+            elif operation == 'line':
+                x1, y1 = x(), y()
+                args = (x1, y1, x(), y1, c) if rng.random() < 0.5 else (x1, y1, x1, y(), c)
+            elif rng.random() < 0.05:
+                args = (c,)
+            else:
+                continue
+            getattr(display, operation)(*args)
+            getattr(reference, operation)(*args)
+            self.assertEqual(display.buffer, reference.buffer, f'{operation}{args}')
+        for px in range(-2, WIDTH + 2):
+            for py in range(-2, HEIGHT + 2):
+                self.assertEqual(display.pixel(px, py), reference.pixel(px, py))
+        self.assertEqual(i2c.bytes, start_bytes)    # Drawing never touches the bus
+
+    def test_show_sends_only_changes(self):
+        display, i2c = create_display()
+        start_bytes = i2c.bytes
+        display.show()
+        self.assertEqual(i2c.bytes, start_bytes)
+        display.pixel(5, 5, 1)
+        display.show()
+        self.assertLess(i2c.bytes - start_bytes, 30)
+
+if __name__ == '__main__':
+    unittest.main()
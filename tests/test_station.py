@@ -0,0 +1,98 @@
+# Station tests, run under CPython with stand-ins for the hardware and the network.
+
+import asyncio
+import time
+import unittest
+
+from station import Station
+
+_NETWORK_S = 0.35       # Time a blocking network request takes
+
+class _Display:
+    def update_readings(self, *args):
+        pass
+
+    def status(self, text, flashcount=1):
+        pass
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(0.25)
+
+class _Connection:
+    async def connect_async(self):
+        return True
+
+    def is_connected(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+class _Power:
+    def deep_sleep_until_next_reading(self):
+        # Blocks, like machine.lightsleep(), until the next whole second.
+        time.sleep(1 - time.time() % 1)
+
+class _Sensor:
+    async def read_sensor_async(self):
+        return int(time.time()), 20.0, 1000.0, 50.0
+
+class _NtpTime:
+    def is_day(self):
+        return True
+
+    def is_sync_due(self):
+        return False
+
+    def get_local_time_string(self, current_time):
+        return ''
+
+class _UploadQueue:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def append(self, *reading):
+        pass
+
+    def count(self):
+        return self.chunks
+
+class _Timestream:
+    def __init__(self):
+        self.uploads = 0
+
+    def upload_queued_readings(self, upload_queue, max_chunks=None):
+        time.sleep(_NETWORK_S)
+        upload_queue.chunks -= 1
+        self.uploads += 1
+        return True
+
+class StationTest(unittest.TestCase):
+    def _run_station(self, deep_sleep, backlog_chunks, seconds):
+        timestream = _Timestream()
+        station = Station(_Display(), _Connection(), _Power(), _Sensor(), _NtpTime(), timestream, _UploadQueue(backlog_chunks),
+                          'office', [], 1, 0, 1, 1, deep_sleep, 0.5)
+
+        async def run():
+            task = asyncio.ensure_future(station.run())
+            await asyncio.sleep(seconds)
+            task.cancel()
+
+        asyncio.run(run())
+        return station, timestream
+
+    def test_keeps_sampling_while_awake_with_backlog(self):
+        station, timestream = self._run_station(False, 20, 6)
+        self.assertGreaterEqual(station.samples, 5)
+        self.assertGreaterEqual(timestream.uploads, 4)
+
+    def test_keeps_sampling_in_deep_sleep_with_backlog(self):
+        # The backlog takes longer to upload than the time to the next reading, so the sampler mustn't wait for it
+        # before taking the reading, while the uploads wait for the reading to be taken.
+        station, timestream = self._run_station(True, 20, 6)
+        self.assertGreaterEqual(station.samples, 5)
+        self.assertGreaterEqual(timestream.uploads, 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# Timestream upload tests, run under CPython with the WriteRecords request replaced by a canned response.
+
+import json
+import struct
+import unittest
+from unittest import mock
+
+import aws_auth
+from timestream import Timestream
+
+class _Display:
+    def __init__(self):
+        self.messages = []
+        self.errors = []
+
+    def status(self, text, flashcount=1):
+        self.messages.append(text)
+
+    def error(self, text):
+        self.errors.append(text)
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+        self.status_code = 200
+
+    def close(self):
+        pass
+
+class _Timestream(Timestream):
+    """ Timestream which returns a canned WriteRecords response, keeping the records sent. """
+    def __init__(self, display, response, multi_measure_records=False):
+        super().__init__(display, None, 'key', 'secret', 'ap-southeast-2', 'WeatherDb', 'Weather', 'office', [], 'DeviceLog',
+                         multi_measure_records)
+        self.response = response
+        self.requests = []
+
+    def write_records_request(self, payload, scanner=None):
+        body = bytearray()
+        payload.write_to(body.extend)
+        self.requests.append(json.loads(body))
+        scanner.feed(self.response.encode('utf-8'))
+        return _Response(self.response)
+
+class UploadTest(unittest.TestCase):
+    def test_rejected_with_existing_version_is_reported(self):
+        display = _Display()
+        response = ('{"RecordsIngested": {"Total": 2}, "RejectedRecords": [{"RecordIndex": 1, "ExistingVersion": 1700000000000, '
+                    '"Reason": "A record with the same time and dimensions but a different measure value already exists."}]}')
+        timestream = _Timestream(display, response)
+        self.assertTrue(timestream.upload_readings([(1700000000, 21.5, 1013.25, 55.0)]))
+        self.assertIn('Uploaded 2 of 3.', display.messages)
+        self.assertEqual(len(display.errors), 1)
+        self.assertIn('1 records rejected', display.errors[0])
+        self.assertIn('existing version 1700000000000', display.errors[0])
+
+    def test_version_is_fixed_per_upload_and_increases(self):
+        timestream = _Timestream(_Display(), '{"RecordsIngested": {"Total": 1}}', multi_measure_records=True)
+        timestream.upload_readings([(1700000000, 21.5, 1013.25, 55.0)])
+        timestream.upload_readings([(1700000000, 21.6, 1013.25, 55.0)])
+        first, second = [request['Records'][0]['Version'] for request in timestream.requests]
+        self.assertGreater(second, first)
+        self.assertNotEqual(first, 1700000000)
+
+    def test_float32_values_uploaded_at_sensor_resolution(self):
+        # Readings are queued as float32, e.g. 21.37 is read back as 21.3700008392334.
+        reading = struct.unpack('<Ifff', struct.pack('<Ifff', 1700000000, 21.37, 1013.0, 55.3))
+        timestream = _Timestream(_Display(), '{"RecordsIngested": {"Total": 3}}')
+        timestream.upload_readings([reading])
+        values = [record['MeasureValue'] for record in timestream.requests[0]['Records']]
+        self.assertEqual(values, ['21.37', '1013', '55.3'])
+
+class _QueryTimestream(Timestream):
+    """ Timestream which keeps the queries sent, rather than sending them. """
+    def query(self, payload, scanner=None):
+        self.query_string = json.loads(payload)['QueryString']
+        return None
+
+class RemoteQueryTest(unittest.TestCase):
+    def _query(self, multi_measure_records, remote_multi_measure_records=None):
+        timestream = _QueryTimestream(_Display(), None, 'key', 'secret', 'ap-southeast-2', 'WeatherDb', 'Weather', 'office', ['outside'],
+                                      'DeviceLog', multi_measure_records, ['temperature'], remote_multi_measure_records)
+        timestream.read_latest_records('WeatherDb', 'Weather', ['outside'], ['temperature'])
+        return timestream.query_string
+
+    def test_remote_format_defaults_to_this_sensors_format(self):
+        self.assertIn("measure_name = 'atmospheric'", self._query(True))
+        self.assertIn("measure_name in ('temperature')", self._query(False))
+
+    def test_remote_format_can_differ(self):
+        self.assertIn("measure_name in ('temperature')", self._query(True, False))
+        self.assertIn("measure_name = 'atmospheric'", self._query(False, True))
+
+class _HttpsPool:
+    def __init__(self):
+        self.requests = []
+
+    def post(self, host, headers, data, scanner=None):
+        self.requests.append((host, headers))
+
+class SigningTest(unittest.TestCase):
+    @mock.patch('aws_auth.time.gmtime', lambda *args: (2023, 6, 18, 22, 4, 5, 6, 169, 0))
+    def test_one_signing_key_for_every_endpoint(self):
+        pool = _HttpsPool()
+        timestream = Timestream(_Display(), pool, 'key', 'secret', 'ap-southeast-2', 'WeatherDb', 'Weather', 'office', [], 'DeviceLog')
+        hosts = ['ingest-cell1.timestream.ap-southeast-2.amazonaws.com', 'ingest-cell2.timestream.ap-southeast-2.amazonaws.com']
+        with mock.patch('aws_auth.getSignatureKey', wraps=aws_auth.getSignatureKey) as get_signature_key:
+            for host in hosts + hosts:
+                timestream.send_timestream_request(host, 'WriteRecords', '{}')
+        self.assertEqual(get_signature_key.call_count, 1)
+        for host, headers in pool.requests:
+            expected = aws_auth.AWSRequestsAuth('key', 'secret', host, 'ap-southeast-2', 'timestream').get_aws_request_headers(
+                'POST', 'https://' + host + '/', '{}')
+            self.assertEqual(headers['Authorization'], expected['Authorization'])
+        self.assertNotEqual(pool.requests[0][1]['Authorization'], pool.requests[1][1]['Authorization'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# UploadQueue tests, run under CPython on a temporary directory.
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import upload_queue
+from upload_queue import UploadQueue
+
+class _Reset(Exception):
+    """ Raised to simulate a reset part way through a compaction. """
+
+class UploadQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'UploadQueue.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _fill(self, queue, start, count):
+        for t in range(start, start + count):
+            queue.append(t, 20.0 + t % 10, 1000.0, 50.0)
+
+    def _times(self, queue):
+        return [reading[0] for reading in queue.peek(1000)]
+
+    def test_readings_survive_reopening(self):
+        queue = UploadQueue(self.filename, max_readings=20, sync_period=5)
+        self._fill(queue, 0, 12)
+        queue.consume(3)
+        queue.sync()
+        self.assertEqual(self._times(UploadQueue(self.filename, max_readings=20, sync_period=5)), list(range(3, 12)))
+
+    def test_compaction_interrupted_at_any_step(self):
+        # Fill the queue until the next sync compacts it, then reset at each file operation of the compaction in turn.
+        # Reopening the queue must keep every reading which was synced and not consumed.
+        real_rename = os.rename
+        real_remove = os.remove
+        real_save_cursor = UploadQueue._save_cursor
+        for step in range(10):
+            self.tearDown()
+            self.setUp()
+            queue = UploadQueue(self.filename, max_readings=10, sync_period=5)
+            self._fill(queue, 0, 10)
+            queue.consume(9)
+            self._fill(queue, 10, 5)
+            queue.consume(1)                    # 10 uploaded readings at the start of the file, so the next sync compacts it
+            self._fill(queue, 15, 4)
+            unread = list(range(10, 15))        # A reset before the sync completes loses the readings buffered in RAM
+            operations = [0]
+
+            def fail_at_step(operation):
+                def wrapper(*args):
+                    operations[0] += 1
+                    if operations[0] == step:
+                        raise _Reset()
+                    return operation(*args)
+                return wrapper
+
+            with mock.patch.object(upload_queue.os, 'rename', fail_at_step(real_rename)), \
+                 mock.patch.object(upload_queue.os, 'remove', fail_at_step(real_remove)), \
+                 mock.patch.object(UploadQueue, '_save_cursor', fail_at_step(real_save_cursor)):
+                try:
+                    self._fill(queue, 19, 1)
+                except _Reset:
+                    pass
+            reopened = UploadQueue(self.filename, max_readings=10, sync_period=5)
+            self.assertIn(self._times(reopened), (unread, list(range(10, 20))), f'reset at operation {step}')
+            self.assertEqual(sorted(os.listdir(self.directory)), ['UploadQueue.bin', 'UploadQueue.bin.pos'])
+
+if __name__ == '__main__':
+    unittest.main()
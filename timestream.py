@@ -8,79 +8,248 @@
 #
 
 import aws_auth
+from endpoint_cache import EndpointCache
+from https_pool import is_timeout
 import json
-import urequests
+from json_scanner import JsonScanner
+import math
+import time
+from write_records_body import WriteRecordsBody
+
+MULTI_MEASURE_NAME = 'atmospheric'     # Measure name used for multi-measure records
+MEASURE_NAMES = ('temperature', 'pressure', 'humidity')
+# Measure names of an aggregated reading (see Aggregator). The mean keeps the measure's name, so it is read like a raw reading.
+AGGREGATE_MEASURE_NAMES = tuple(name + suffix for name in MEASURE_NAMES for suffix in ('_min', '', '_max', '_count'))
+WRITE_RECORDS_LIMIT = 100               # Maximum number of records accepted by a single WriteRecords request
+
+# The only response fields used, which are extracted as the response is received rather than parsing the whole response.
+_WRITE_RECORDS_FIELDS = [('RecordsIngested', 'Total'), ('RejectedRecords', '*', 'RecordIndex'),
+                         ('RejectedRecords', '*', 'ExistingVersion'), ('RejectedRecords', '*', 'Reason')]
+_ENDPOINT_FIELDS = [('Endpoints', 0, 'Address'), ('Endpoints', 0, 'CachePeriodInMinutes')]
+_QUERY_FIELDS = [('Rows', '*', 'Data', '*', 'ScalarValue')]
+_REMOTE_WINDOW_S = 30 * 60             # Oldest remote reading read (seconds), when there is no recent reading to read on from
+
+def _quote(text):
+    return "'" + text.replace("'", "''") + "'"
+
+def _format_value(value):
+    """ Format a measure value to 0.01, the resolution of the BME280 temperature (pressure is in hPa, humidity in %RH), without trailing zeros.
+        Values are queued as float32, so e.g. 21.37 would otherwise be uploaded as 21.3700008392334 under CPython.
+    """
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+def _is_valid(value):
+    """ Return True if the measure value can be uploaded (e.g. not the NaN returned on an I2C error). """
+    return value != None and math.isfinite(value)
 
 class Timestream:
     """
     """    
-    def __init__(self, display, aws_access_key : str, aws_secret_access_key : str, aws_region : str, 
-                 database_name : str, sensor_readings_table : str, sensor_location : str, remote_sensor_location : str, device_log_table : str):
+    def __init__(self, display, https_pool, aws_access_key : str, aws_secret_access_key : str, aws_region : str, 
+                 database_name : str, sensor_readings_table : str, sensor_location : str, remote_sensor_locations : list, device_log_table : str,
+                 multi_measure_records : bool = False, remote_measures : list = ('temperature',), remote_multi_measure_records : bool = None):
         self._display = display
+        self._https_pool = https_pool
         self._aws_access_key = aws_access_key
         self._aws_secret_access_key = aws_secret_access_key
         self._aws_region = aws_region
         self._database_name = database_name
         self._sensor_readings_table = sensor_readings_table
         self._sensor_location = sensor_location
-        self._remote_sensor_location = remote_sensor_location
+        self._remote_sensor_locations = remote_sensor_locations
+        self._remote_measures = remote_measures
         self._device_log_table = device_log_table
+        self._multi_measure_records = multi_measure_records
+        # The format the remote sensors upload in, which decides the shape of the query reading them.
+        self._remote_multi_measure_records = multi_measure_records if remote_multi_measure_records == None else remote_multi_measure_records
+        self._remote_last_seen = {}     # Location -> time (seconds) of the latest remote reading read
+        self._remote_cadence = {}       # Location -> estimated seconds between new remote readings becoming available
+        self._remote_delay = {}         # Location -> shortest observed seconds between a remote reading's time and it being read
+        self.remote_queries_issued = 0  # Number of remote sensor queries sent
+        self.remote_queries_skipped = 0 # Number of remote sensor reads skipped, as no new readings could exist yet
+        self._endpoint_cache = EndpointCache()
+        # One signer for every endpoint, as the signing key only depends on the date, region and service.
+        self._signer = aws_auth.AWSRequestsAuth(aws_access_key=aws_access_key,
+                                                aws_secret_access_key=aws_secret_access_key,
+                                                aws_host=None,
+                                                aws_region=aws_region,
+                                                aws_service='timestream')
+        self._record_version = 0        # Version of the records being uploaded
 
-    def format_readings(self, current_time, tempC, pres_hPa, humRH):
+    def format_readings(self, current_time, *values):
+        """ Format a reading as a list of Timestream records, dropping any non-finite measure values.
+            The values are either (tempC, pres_hPa, humRH), or an aggregated reading named by AGGREGATE_MEASURE_NAMES.
+            Each record's Version is the time the upload started (in milliseconds), so a later upload of a different value for the same time
+            replaces the stored value. Timestream accepts an identical record which is re-sent, whatever its Version.
+        """
+        names = MEASURE_NAMES if len(values) == len(MEASURE_NAMES) else AGGREGATE_MEASURE_NAMES
+        version = self._record_version
+        current_time = f'{int(current_time)}'
 
-        temperature = {
-            'MeasureName': 'temperature',
-            'MeasureValue': f'{tempC}',
-            'Time': current_time
-        }
-
-        pressure = {
-            'MeasureName': 'pressure',
-            'MeasureValue': f'{pres_hPa}',
-            'Time': current_time
-        }
-
-        humidity = {
-            'MeasureName': 'humidity',
-            'MeasureValue': f'{humRH}',
-            'Time': current_time
-        }
+        if self._multi_measure_records:
+            # A single record holding all three measures, rather than one record per measure.
+            measure_values = [ { 'Name': name, 'Value': _format_value(value), 'Type': 'DOUBLE' }
+                               for name, value in zip(names, values) if _is_valid(value) ]
+            if not measure_values:
+                return []
+            reading = {
+                'MeasureName': MULTI_MEASURE_NAME,
+                'MeasureValues': measure_values,
+                'Time': current_time,
+                'Version': version
+            }
+            return [reading]
 
-        return [temperature, pressure, humidity]
+        return [ { 'MeasureName': name, 'MeasureValue': _format_value(value), 'Time': current_time, 'Version': version }
+                 for name, value in zip(names, values) if _is_valid(value) ]
 
     def upload_readings(self, readings):
-
-        self._display.status(f'Upload {len(readings)} reads.')
+        """ Upload a list of readings, each a tuple of (current_time, tempC, pres_hPa, humRH) or an aggregated reading.
+            The readings must fit in a single WriteRecords request (see upload_queued_readings).
+            Returns True if the readings no longer need to be uploaded, i.e. every record was either ingested or
+            rejected by Timestream. Rejected records are reported as errors and dropped, as re-sending them can't succeed.
+        """
         dimensions = [ {'Name': 'location', 'Value': self._sensor_location} ]
         commonAttributes = {
                 'Dimensions': dimensions,
-                'MeasureValueType': 'DOUBLE',
+                'MeasureValueType': 'MULTI' if self._multi_measure_records else 'DOUBLE',
                 'TimeUnit' : 'SECONDS'
                 }
-        response = self.write_records(self._database_name, self._sensor_readings_table, readings, commonAttributes )    
+        # The records are streamed to the socket rather than held in memory, so only their count is known here.
+        # The body is serialized twice, so the version is fixed for the whole upload. It always increases, even if the RTC is set back.
+        self._record_version = max(time.time_ns() // 1000000, self._record_version + 1)
+        body = WriteRecordsBody(self.format_readings, self._database_name, self._sensor_readings_table, commonAttributes, readings)
+        body.prepare()
+        record_count = body.record_count
+        if not record_count:
+            return True
+
+        self._display.status(f'Upload {record_count} reads.')
+        scanner = JsonScanner(_WRITE_RECORDS_FIELDS)
+        response = self.write_records_request(body, scanner)
         if response != None:
             try:
-                total = json.loads(response.text)["RecordsIngested"]["Total"]
-                self._display.status(f'Uploaded {total} of {len(readings)}.')
-
-                if total == len(readings):
-                    readings.clear()
-                    return
-            except KeyError:
-                self._display.error(response.text)
+                rejected = sorted(set(path[1] for path in scanner.values if path[0] == 'RejectedRecords'))
+                if rejected:
+                    # A record is only rejected with an ExistingVersion if a different value is already stored with a Version at least as high.
+                    reason = scanner.get(('RejectedRecords', rejected[0], 'Reason'))
+                    existing_version = scanner.get(('RejectedRecords', rejected[0], 'ExistingVersion'))
+                    if existing_version != None:
+                        reason = f'{reason} (existing version {existing_version})'
+                    self._display.status(f'Uploaded {record_count - len(rejected)} of {record_count}.')
+                    self._display.error(f'{len(rejected)} records rejected: {reason}')
+                    return True
+
+                total = scanner.get(('RecordsIngested', 'Total'))
+                if total == None:
+                    self._display.error(response.text)
+                else:
+                    self._display.status(f'Uploaded {total} of {record_count}.')
+                    if total == record_count:
+                        return True
+            finally:
+                response.close()
         self._display.error("Upload failed.")
+        return False
+
+    def upload_queued_readings(self, upload_queue, max_chunks=None):
+        """ Upload the readings in the upload queue, in chunks which fit within the WriteRecords record limit.
+            Readings are only removed from the queue once their chunk has been accepted, so a failed chunk
+            (and any following chunks) will be retried on the next upload.
+            At most max_chunks chunks are uploaded (None = upload the whole queue).
+            Returns False if a chunk failed to upload.
+        """
+        readings_per_chunk = WRITE_RECORDS_LIMIT if self._multi_measure_records else WRITE_RECORDS_LIMIT // upload_queue.values_per_reading
+        while upload_queue.count() > 0 and max_chunks != 0:
+            readings = upload_queue.peek(readings_per_chunk)
+            if not self.upload_readings(readings):
+                return False
+            upload_queue.consume(len(readings))
+            if max_chunks:
+                max_chunks -= 1
+        return True
+
+    def _remote_locations_due(self, now, locations):
+        """ Return the locations which may have uploaded new readings since they were last read. """
+        due = []
+        for location in locations:
+            last_seen = self._remote_last_seen.get(location)
+            cadence = self._remote_cadence.get(location)
+            if last_seen == None or cadence == None or now >= last_seen + cadence + self._remote_delay.get(location, 0):
+                due.append(location)
+        return due
 
-    def read_remote_sensor(self, last_valid_reading):
+    def _update_remote_cadence(self, location, last_seen, now):
+        """ Record the time of the latest reading read for location, and refine the estimates of how often it uploads
+            and how long its readings take to be uploaded.
+        """
+        previous = self._remote_last_seen.get(location)
+        self._remote_last_seen[location] = last_seen
+        if previous != None and last_seen <= previous:
+            return
+        delay = max(0, now - last_seen)
+        self._remote_delay[location] = min(delay, self._remote_delay.get(location, delay))
+        if previous == None:
+            return
+        interval = last_seen - previous
+        cadence = self._remote_cadence.get(location)
+        # Shorten the estimate at once, but only lengthen it gradually, as a missed query makes the interval look longer.
+        if cadence == None or interval < cadence:
+            self._remote_cadence[location] = interval
+        else:
+            self._remote_cadence[location] = (cadence * 3 + interval) // 4
 
+    def read_remote_sensors(self, last_valid_readings : dict, locations : list = None):
+        """ Read the latest value of each remote measure for every remote sensor location (or just those in locations), in a single query.
+            Only locations which may have uploaded new readings since they were last read are queried, and only for newer readings.
+            Returns a table of {location : {measure : value}}. Values which couldn't be read keep their value in last_valid_readings.
+        """
+        if locations == None:
+            locations = self._remote_sensor_locations
+        readings = {}
+        for location, values in last_valid_readings.items():
+            readings[location] = dict(values)
         try:
-            if self._remote_sensor_location:    # Only read the remote sensor if it has a valid name
-                response = self.read_last_record(self._database_name, self._sensor_readings_table, self._remote_sensor_location, 'temperature')
+            if locations:    # Only read the remote sensors if there are any
+                now = int(time.time())
+                locations = self._remote_locations_due(now, locations)
+                if not locations:
+                    self.remote_queries_skipped += 1
+                    return readings
+                self.remote_queries_issued += 1
+                print(f'Reading remote sensors {locations} ({self.remote_queries_issued} queries issued, {self.remote_queries_skipped} skipped)')
+                scanner = JsonScanner(_QUERY_FIELDS)
+                response = self.read_latest_records(self._database_name, self._sensor_readings_table, locations, self._remote_measures, scanner)
                 if response:
-                    reading = float(json.loads(response.text)["Rows"][0]["Data"][0]["ScalarValue"])
-                    return reading
+                    response.close()
+                    rows = set(path[1] for path in scanner.values)
+                    if not rows and response.status_code != 200:
+                        raise ValueError(response.text)
+                    # Each row ends with the time of its latest reading, in milliseconds.
+                    time_column = len(self._remote_measures) + 1 if self._remote_multi_measure_records else 3
+                    last_seen = {}
+                    for row in rows:
+                        location = scanner.get(('Rows', row, 'Data', 0, 'ScalarValue'))
+                        values = readings.setdefault(location, {})
+                        if self._remote_multi_measure_records:
+                            # location, then a column for each measure
+                            for i, measure in enumerate(self._remote_measures):
+                                value = scanner.get(('Rows', row, 'Data', i + 1, 'ScalarValue'))
+                                if value != None:
+                                    values[measure] = float(value)
+                        else:
+                            # location, measure_name, value
+                            value = scanner.get(('Rows', row, 'Data', 2, 'ScalarValue'))
+                            if value != None:
+                                values[scanner.get(('Rows', row, 'Data', 1, 'ScalarValue'))] = float(value)
+                        row_time = scanner.get(('Rows', row, 'Data', time_column, 'ScalarValue'))
+                        if row_time != None:
+                            last_seen[location] = max(last_seen.get(location, 0), int(row_time) // 1000)
+                    for location, location_last_seen in last_seen.items():
+                        self._update_remote_cadence(location, location_last_seen, now)
         except Exception as e:
-            self._display.error(f'read_remote_sensor failed: {str(e)}')
-        return last_valid_reading
+            self._display.error(f'read_remote_sensors failed: {str(e)}')
+        return readings
 
     def upload_last_error(self, log):
 
@@ -95,76 +264,113 @@ class Timestream:
                 'MeasureValueType': 'VARCHAR',
                 'TimeUnit' : 'SECONDS'
                 }
-        response = self.write_records( self._database_name, self._device_log_table, last_error, commonAttributes )    
+        scanner = JsonScanner(_WRITE_RECORDS_FIELDS)
+        response = self.write_records( self._database_name, self._device_log_table, last_error, commonAttributes, scanner )    
         if response != None:
-            try:
-                total = json.loads(response.text)["RecordsIngested"]["Total"]
-                if total == len(last_error):
-                    self._display.status(f'Upload successful.')
-                    log.clear_last_error()
-                    return
-            except KeyError:
-                self._display.error(response.text)
+            response.close()
+            total = scanner.get(('RecordsIngested', 'Total'))
+            if total == len(last_error):
+                self._display.status(f'Upload successful.')
+                log.clear_last_error()
+                return
+            self._display.error(response.text)
         self._display.error("Upload failed.")        
 
-    def send_timestream_request(self, host, command, payload="{}"):
+    def send_timestream_request(self, host, command, payload="{}", scanner=None):
         url = "https://" + host + "/"
 
-        auth = aws_auth.AWSRequestsAuth(aws_access_key=self._aws_access_key,
-                            aws_secret_access_key=self._aws_secret_access_key,
-                            aws_host=host,
-                            aws_region=self._aws_region,
-                            aws_service='timestream')
-
         headers = {
             'X-Amz-Target': 'Timestream_20181101.{}'.format(command),
             'Content-Type': 'application/x-amz-json-1.0',
             'x-amz-api-version': '2018-11-01'
             }
         
-        auth_headers = auth.get_aws_request_headers("POST", url, payload)
+        payload_hash = payload.payload_hash if isinstance(payload, WriteRecordsBody) else None
+        auth_headers = self._signer.get_aws_request_headers("POST", url, payload, payload_hash, host)
         headers = headers|auth_headers
 
-        return urequests.post(url, headers=headers, data=payload)
+        return self._https_pool.post(host, headers=headers, data=payload, scanner=scanner)
 
     def get_host_cell(self, mode):
+        cachedHost = self._endpoint_cache.get(mode, self._aws_region)
+        if cachedHost:
+            return cachedHost
         describeHost = f"{mode}.timestream.{self._aws_region}.amazonaws.com"
         try:
-            response = self.send_timestream_request(describeHost, "DescribeEndpoints" )
-            queryHost = json.loads(response.text)["Endpoints"][0]["Address"]
+            scanner = JsonScanner(_ENDPOINT_FIELDS)
+            response = self.send_timestream_request(describeHost, "DescribeEndpoints", scanner=scanner)
+            response.close()
+            queryHost = scanner.get(('Endpoints', 0, 'Address'))
             if queryHost:
+                self._endpoint_cache.put(mode, self._aws_region, queryHost, scanner.get(('Endpoints', 0, 'CachePeriodInMinutes'), 0))
                 return queryHost
+            self._display.error(f'get_host_cell failed: {response.text}')
         except Exception as e:
             self._display.error(f'get_host_cell failed: {str(e)}')
         return None
 
-    def query(self, payload):
+    def send_to_host_cell(self, mode, command, payload, scanner=None):
+        """ Send a request to the cached (or newly discovered) endpoint for the given mode.
+            If the endpoint fails or reports it is no longer valid (HTTP 421), it is removed from the cache
+            and the request is retried once on a newly discovered endpoint. A timeout isn't retried, as the request may have been processed.
+        """
+        for retry in range(2):
+            host = self.get_host_cell(mode)
+            if not host:
+                return None
+            try:
+                response = self.send_timestream_request(host, command, payload, scanner)
+                if response.status_code != 421:     # InvalidEndpointException
+                    return response
+                response.close()
+                if retry:
+                    return None
+            except Exception as e:
+                if retry or is_timeout(e):
+                    raise
+            self._endpoint_cache.invalidate(mode, self._aws_region)
+        return None
+
+    def query(self, payload, scanner=None):
         try:
-            queryHost = self.get_host_cell('query')
-            if queryHost:
-                return self.send_timestream_request(queryHost, "Query", payload )
+            return self.send_to_host_cell('query', "Query", payload, scanner)
         except Exception as e:
             self._display.error(f'query failed: {str(e)}')
         return None
 
-    def write_records_request(self, payload):
+    def write_records_request(self, payload, scanner=None):
         try:
-            ingestHost = self.get_host_cell('ingest')
-            if ingestHost:
-                return self.send_timestream_request(ingestHost, "WriteRecords", payload )
+            return self.send_to_host_cell('ingest', "WriteRecords", payload, scanner)
         except Exception as e:
             self._display.error(str(e))
         return None
 
-    def write_records(self, databaseName, tableName, records, commonAttributes):
+    def write_records(self, databaseName, tableName, records, commonAttributes, scanner=None):
 
         payload = { "DatabaseName" : databaseName, "TableName" : tableName, "Records" : records, "CommonAttributes" : commonAttributes }
-        return self.write_records_request(json.dumps(payload))
+        return self.write_records_request(json.dumps(payload), scanner)
 
-    def read_last_record(self, databaseName, tableName, sensor_location, measurement_name):
-        query_string = f'select MAX_BY(measure_value::double, time) FROM {databaseName}."{tableName}" WHERE measure_name = \'{measurement_name}\' and location=\'{sensor_location}\' and time between ago(30m) and now()'
+    def read_latest_records(self, databaseName, tableName, sensor_locations, measurement_names, scanner=None):
+        """ Query the latest value of each measure for each sensor location, newer than the last reading read from that location.
+            Each row is (location, measure_name, value, time), or (location, value of each measure, time) for multi-measure records.
+            The time is the time of the row's latest reading, in milliseconds.
+        """
+        # Only scan the readings newer than those already read, and never more than the last 30 minutes.
+        oldest = int(time.time()) - _REMOTE_WINDOW_S
+        windows = []
+        for location in sensor_locations:
+            since = max(self._remote_last_seen.get(location, oldest), oldest)
+            windows.append(f'(location = {_quote(location)} and time > from_milliseconds({since * 1000}))')
+        windows = ' or '.join(windows)
+        if self._remote_multi_measure_records:
+            # Each measure is stored in its own column of a multi-measure record, which may be null if it wasn't sampled.
+            columns = ', '.join([f'MAX_BY({name}, CASE WHEN {name} IS NULL THEN NULL ELSE time END)' for name in measurement_names])
+            query_string = f'select location, {columns}, to_milliseconds(MAX(time)) FROM {databaseName}."{tableName}" WHERE measure_name = \'{MULTI_MEASURE_NAME}\' and ({windows}) and time <= now() group by location'
+        else:
+            names = ', '.join([_quote(name) for name in measurement_names])
+            query_string = f'select location, measure_name, MAX_BY(measure_value::double, time), to_milliseconds(MAX(time)) FROM {databaseName}."{tableName}" WHERE measure_name in ({names}) and ({windows}) and time <= now() group by location, measure_name'
         payload = { "QueryString" : query_string }
-        return self.query(json.dumps(payload))
+        return self.query(json.dumps(payload), scanner)
 
 
 
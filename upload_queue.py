@@ -0,0 +1,173 @@
+# UploadQueue class
+#
+# Copyright (C) Mark Gladding 2023.
+#
+# MIT License (see the accompanying license file)
+#
+# https://github.com/mark-gladding/weatherstation
+#
+
+import os
+import struct
+
+_COPY_CHUNK_RECORDS = 32     # Number of records copied at a time when compacting the queue
+
+class UploadQueue:
+    """Class providing a bounded queue of sensor readings waiting to be uploaded, stored on flash.
+
+     Readings are appended to a file of fixed size binary records, so they survive a reset.
+     A separate read cursor only advances once the readings have been confirmed as uploaded.
+     Appends are buffered in RAM and written in batches to limit flash wear.
+     The file is compacted once the uploaded readings at its start reach max_readings. A compaction interrupted by a reset
+     is completed when the queue is next opened, so no readings are lost.
+    """
+    def __init__(self, filename='UploadQueue.bin', max_readings=1440, sync_period=10, values_per_reading=3):
+        """Constructor
+
+        Args:
+            filename (str, optional): Name of the file used to store the queued readings. Defaults to 'UploadQueue.bin'.
+            max_readings (int, optional): Maximum number of readings to keep. Once full, the oldest readings are dropped. Defaults to 1440 (1 day).
+            sync_period (int, optional): Number of readings to buffer in RAM before writing them to flash. Defaults to 10.
+            values_per_reading (int, optional): Number of values in each reading, after the time. Defaults to 3 (temperature (C), pressure (hPa), humidity (%RH)).
+                Use a different filename for each number of values, as the record size isn't stored in the file.
+        """
+        self.values_per_reading = values_per_reading
+        self._record_format = '<I' + 'f' * values_per_reading     # time (seconds), values
+        self._record_size = struct.calcsize(self._record_format)
+        self._filename = filename
+        self._cursor_filename = filename + '.pos'
+        self._temp_filename = filename + '.tmp'         # Unread readings being copied by a compaction
+        self._compacted_filename = filename + '.new'    # Unread readings copied by a compaction which hasn't been completed
+        self._max_readings = max_readings
+        self._sync_period = max(1, sync_period)
+        self._pending = bytearray(self._sync_period * self._record_size)
+        self._pending_count = 0
+        self._record = bytearray(self._record_size)
+        self.dropped = 0        # Number of readings dropped because the queue was full
+
+        self._read_offset = self._load_cursor()
+        self._recover()
+        try:
+            self._write_offset = os.stat(self._filename)[6]
+        except OSError:
+            self._write_offset = 0
+        self._write_offset -= self._write_offset % self._record_size     # Discard any partially written record
+        if self._read_offset > self._write_offset:
+            self._reset()
+
+    def _load_cursor(self):
+        try:
+            with open(self._cursor_filename, 'rb') as f:
+                return struct.unpack('<I', f.read(4))[0]
+        except (OSError, ValueError, struct.error):
+            return 0
+
+    def _save_cursor(self):
+        with open(self._cursor_filename, 'wb') as f:
+            f.write(struct.pack('<I', self._read_offset))
+
+    def _remove(self, filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def _recover(self):
+        """ Complete a compaction interrupted by a reset, or discard it if the unread readings hadn't all been copied. """
+        self._remove(self._temp_filename)
+        try:
+            os.stat(self._compacted_filename)
+        except OSError:
+            return
+        self._complete_compaction()
+
+    def _complete_compaction(self):
+        # The compacted file holds every unread reading from its start, so the cursor is saved first.
+        self._read_offset = 0
+        self._save_cursor()
+        self._remove(self._filename)
+        os.rename(self._compacted_filename, self._filename)
+
+    def _reset(self):
+        self._remove(self._filename)
+        self._remove(self._cursor_filename)
+        self._read_offset = 0
+        self._write_offset = 0
+
+    def count(self):
+        """ Return the number of readings in the queue. """
+        return (self._write_offset - self._read_offset) // self._record_size + self._pending_count
+
+    def append(self, current_time, *values):
+        """ Append a reading to the queue. The reading is written to flash once sync_period readings have been buffered.
+            If the queue is full, the oldest reading is dropped.
+        """
+        if self.count() >= self._max_readings:
+            if self._write_offset > self._read_offset:
+                self._read_offset += self._record_size
+            else:
+                self._pending_count -= 1
+                self._pending[0:self._pending_count * self._record_size] = self._pending[self._record_size:(self._pending_count + 1) * self._record_size]
+            self.dropped += 1
+        struct.pack_into(self._record_format, self._pending, self._pending_count * self._record_size, int(current_time), *values)
+        self._pending_count += 1
+        if self._pending_count >= self._sync_period:
+            self.sync()
+
+    def sync(self):
+        """ Write any buffered readings (and the read cursor) to flash. """
+        if self._pending_count == 0:
+            return
+        if self._read_offset >= self._max_readings * self._record_size:
+            self._compact()
+        with open(self._filename, 'ab') as f:
+            f.write(memoryview(self._pending)[0:self._pending_count * self._record_size])
+        self._write_offset += self._pending_count * self._record_size
+        self._pending_count = 0
+        self._save_cursor()
+        if hasattr(os, 'sync'):
+            os.sync()
+
+    def _compact(self):
+        """ Copy the unread readings to the start of a new file, so the file doesn't grow without bound.
+            Once all of them have been copied, the new file is renamed, which commits the compaction. The cursor is then reset and
+            the new file replaces the old one. _recover() completes these steps if they are interrupted.
+        """
+        buffer = bytearray(_COPY_CHUNK_RECORDS * self._record_size)
+        with open(self._filename, 'rb') as src, open(self._temp_filename, 'wb') as dst:
+            src.seek(self._read_offset)
+            while True:
+                size = src.readinto(buffer)
+                if not size:
+                    break
+                dst.write(memoryview(buffer)[0:size])
+        os.rename(self._temp_filename, self._compacted_filename)
+        self._write_offset -= self._read_offset
+        self._complete_compaction()
+
+    def peek(self, max_readings):
+        """ Return up to max_readings of the oldest readings in the queue, without removing them.
+            Each reading is a tuple of (current_time, values...), e.g. (current_time, tempC, pres_hPa, humRH).
+        """
+        self.sync()
+        readings = []
+        count = min(max_readings, self.count())
+        if count == 0:
+            return readings
+        with open(self._filename, 'rb') as f:
+            f.seek(self._read_offset)
+            for i in range(count):
+                f.readinto(self._record)
+                reading = struct.unpack(self._record_format, self._record)
+                readings.append(reading)
+        return readings
+
+    def consume(self, count):
+        """ Remove the oldest count readings from the queue, once they have been confirmed as uploaded. """
+        if count <= 0:
+            return
+        self._read_offset = min(self._read_offset + count * self._record_size, self._write_offset)
+        if self._read_offset == self._write_offset:
+            self._reset()
+        else:
+            self._save_cursor()
@@ -0,0 +1,86 @@
+# WriteRecordsBody class
+#
+# Copyright (C) Mark Gladding 2023.
+#
+# MIT License (see the accompanying license file)
+#
+# https://github.com/mark-gladding/weatherstation
+#
+
+import binascii
+import hashlib
+import json
+
+class WriteRecordsBody:
+    """Class streaming the JSON body of a Timestream WriteRecords request, rather than building it as a single string.
+
+     Records are serialized one reading at a time into a reusable buffer, which is passed on whenever it fills.
+     The body is serialized twice: once to calculate its length and SHA-256 hash (needed to sign the request
+     before it is sent), then again while it is being written to the socket.
+     Peak memory is therefore bounded by the chunk size, rather than by the number of readings.
+    """
+    def __init__(self, format_readings, database_name : str, table_name : str, common_attributes : dict, readings, chunk_size : int = 512):
+        """Constructor
+
+        Args:
+            format_readings (function): Formats a reading as a list of Timestream records (see Timestream.format_readings).
+            database_name (str): Name of the database.
+            table_name (str): Name of the table.
+            common_attributes (dict): Attributes common to all records.
+            readings (list): The readings to upload.
+            chunk_size (int, optional): Size in bytes of the buffer used to serialize the body. Defaults to 512.
+        """
+        self._format_readings = format_readings
+        self._prefix = ('{"DatabaseName": ' + json.dumps(database_name) + ', "TableName": ' + json.dumps(table_name) +
+                        ', "CommonAttributes": ' + json.dumps(common_attributes) + ', "Records": [').encode('utf-8')
+        self._readings = readings
+        self._buffer = bytearray(chunk_size)
+        self._used = 0
+        self._write = None
+        self.length = 0             # Length of the body in bytes
+        self.record_count = 0       # Number of records in the body
+        self.payload_hash = None    # Hex SHA-256 hash of the body
+
+    def prepare(self):
+        """ Serialize the body to calculate its length, record count and payload hash, without storing it. """
+        sha = hashlib.sha256()
+        self.length = 0
+
+        def hash_chunk(chunk):
+            sha.update(chunk)
+            self.length += len(chunk)
+
+        self.record_count = self.write_to(hash_chunk)
+        self.payload_hash = binascii.hexlify(sha.digest()).decode('utf-8')
+
+    def write_to(self, write):
+        """ Serialize the body, passing it to write in chunks of at most chunk_size bytes. Returns the number of records. """
+        self._write = write
+        self._used = 0
+        self._append(self._prefix)
+        record_count = 0
+        for reading in self._readings:
+            for record in self._format_readings(*reading):
+                if record_count:
+                    self._append(b', ')
+                self._append(json.dumps(record).encode('utf-8'))
+                record_count += 1
+        self._append(b']}')
+        self._flush()
+        self._write = None
+        return record_count
+
+    def _append(self, data):
+        view = memoryview(data)
+        while len(view):
+            size = min(len(view), len(self._buffer) - self._used)
+            self._buffer[self._used:self._used + size] = view[:size]
+            self._used += size
+            view = view[size:]
+            if self._used == len(self._buffer):
+                self._flush()
+
+    def _flush(self):
+        if self._used:
+            self._write(memoryview(self._buffer)[:self._used])
+            self._used = 0